@@ -3,25 +3,66 @@ import bmesh
 from mathutils import Vector
 from math import radians
 import math
+import numpy as np
+
+from Ch6.mesh_arrays import fill_mesh, get_vert_coords, get_loop_verts, get_face_loop_starts, \
+    get_face_loop_totals
+from Ch6.topology_arrays import face_loop_indices
+from Ch6.name_index import scene_object_index
 
 def add_cone_once(context, location = (0, 0, 0), vertices = 8, radius1 = 2.0, depth = 3.0):
-    if context.scene.objects.find('Cone') < 0:
+    scene_objects = scene_object_index(context.scene)
+    if scene_objects.get('Cone') is None:
         if context.scene.objects.active is not None:
             bpy.ops.object.mode_set(mode = 'OBJECT')
         bpy.ops.mesh.primitive_cone_add(location = location, vertices = vertices, radius1 = radius1, depth = depth)
+        cone = context.scene.objects.active
+        scene_objects.add(cone.name, cone)
+
+# With linked = True the copy shares obj's mesh instead of duplicating it. The edit 
+# entry points below (edit_obj_bmesh and write_bmesh_to_obj) give the copy its own mesh 
+# the first time it is edited, so the edit doesn't reach the original and the other 
+# copies.
+def get_object_copy(context, obj, linked = False):
+    return get_object_copies(context, obj, 1, linked)[0]
 
-def get_object_copy(context, obj):
+# Create and link count copies of obj, with a single scene update at the end.
+def get_object_copies(context, obj, count, linked = False):
     context.scene.objects.active = obj
     bpy.ops.object.mode_set(mode = 'OBJECT')
-    obj_copy = bpy.data.objects.new(name = obj.name + '_copy', object_data = obj.data.copy())
-    context.scene.objects.link(obj_copy)
+    obj_copies = []
+    for _ in range(count):
+        obj_data = obj.data if linked else obj.data.copy()
+        obj_copy = bpy.data.objects.new(name = obj.name + '_copy', object_data = obj_data)
+        context.scene.objects.link(obj_copy)
+        obj_copies.append(obj_copy)
     context.scene.update()
-    return obj_copy
+    return obj_copies
+
+# Copy on first edit: give obj its own mesh if it's still sharing one with other objects.
+def make_single_user(obj):
+    if obj.data.users > 1:
+        obj.data = obj.data.copy()
+    return obj.data
+
+# Make obj active, put it into Edit mode and return its edit bmesh, copying a shared 
+# mesh first.
+def edit_obj_bmesh(context, obj):
+    if context.scene.objects.active is not None:
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+    make_single_user(obj)
+    context.scene.objects.active = obj
+    bpy.ops.object.mode_set(mode = 'EDIT')
+    return bmesh.from_edit_mesh(obj.data)
+
+# Write bm into obj's mesh, copying a shared mesh first.
+def write_bmesh_to_obj(bm, obj):
+    bm.to_mesh(make_single_user(obj))
 
 def bmesh_from_existing():
     add_cone_once(bpy.context, (2, 3, 3), 16, 1.5, 5.0)
     cone = bpy.data.objects['Cone']
-    cone_copy = get_object_copy(bpy.context, cone)
+    cone_copy = get_object_copy(bpy.context, cone, linked = True)
     cone_copy.location = cone.location + Vector((0, -6, 0))
     cone_copy_mirror_mod = cone_copy.modifiers.new('mirror_mod', 'MIRROR')
     cone_copy_mirror_mod.show_in_editmode = True
@@ -32,12 +73,7 @@ def bmesh_from_existing():
     cone_copy_subsurf_mod = cone_copy.modifiers.new('subsurf_mod', 'SUBSURF')
     cone_copy_subsurf_mod.levels = 1
     
-    if bpy.context.scene.objects.active is not None:
-        bpy.ops.object.mode_set(mode = 'OBJECT')
-    bpy.context.scene.objects.active = cone_copy
-    bpy.ops.object.mode_set(mode = 'EDIT')
-    
-    bm = bmesh.from_edit_mesh(cone_copy.data)
+    bm = edit_obj_bmesh(bpy.context, cone_copy)
     bmesh.ops.scale(bm, vec = (1, 2, 0.5), verts = bm.verts)
     bmesh.update_edit_mesh(cone_copy.data)
     bpy.ops.object.mode_set(mode = 'OBJECT')
@@ -68,40 +104,63 @@ def bmesh_from_scratch():
 def bmesh_as_sketch_pad():     
     add_cone_once(bpy.context, (2, 5, 3), 16, 1.5, 5.0)
     cone = bpy.data.objects['Cone']
-    cone_copy_1 = get_object_copy(bpy.context, cone)
+    cone_copy_1, cone_copy_2 = get_object_copies(bpy.context, cone, 2, linked = True)
     cone_copy_1.location = cone.location + Vector((0, -4, 0))
-    cone_copy_2 = get_object_copy(bpy.context, cone)
     cone_copy_2.location = cone.location + Vector((0, -9, 0))    
     
     bm = bmesh.new()
     bmesh.ops.create_circle(bm, cap_ends = True, segments = 8, diameter = 2)
-    bm.to_mesh(cone_copy_1.data)
-    bm.to_mesh(cone_copy_2.data)
+    write_bmesh_to_obj(bm, cone_copy_1)
+    write_bmesh_to_obj(bm, cone_copy_2)
         
+# Coordinates of num_segments verts on each of a stack of rings, ring after ring. radii 
+# and z hold one value per ring; the first vert of every ring sits on the +x axis, the 
+# same layout add_circle has always used.
+def ring_coords(radii, num_segments, z):
+    radii = np.asarray(radii, dtype = np.float64).reshape(-1, 1)
+    z = np.broadcast_to(np.asarray(z, dtype = np.float64).reshape(-1, 1), radii.shape)
+    theta = np.arange(num_segments)*(2*math.pi/num_segments)
+    coords = np.empty((len(radii), num_segments, 3), dtype = np.float32)
+    coords[..., 0] = radii*np.cos(theta)
+    coords[..., 1] = radii*np.sin(theta)
+    coords[..., 2] = z
+    return coords.reshape(-1, 3)
+
+# Edge vert index pairs (k, k+1) closing back to the first vert, for num_rings rings of 
+# num_segments verts laid out by ring_coords, starting at vert index offset.
+def ring_edges(num_rings, num_segments, offset = 0):
+    ring_starts = offset + np.arange(num_rings)*num_segments
+    segment = np.arange(num_segments)
+    edges = np.empty((num_rings, num_segments, 2), dtype = np.int32)
+    edges[..., 0] = ring_starts[:, None] + segment
+    edges[..., 1] = ring_starts[:, None] + (segment + 1) % num_segments
+    return edges.reshape(-1, 2)
+
+# Add all the rings in one go: the coordinates and edges go into a scratch mesh with 
+# foreach_set and the whole lot is appended to bm with a single from_mesh, instead of 
+# one verts.new/edges.new call per segment. Returns the new verts as one list per ring.
+def add_circles(bm, radii, num_segments, z):
+    coords = ring_coords(radii, num_segments, z)
+    num_rings = len(coords)//num_segments
+    mesh_rings = bpy.data.meshes.new(name = 'rings_tmp')
+    fill_mesh(mesh_rings, coords, [], [], ring_edges(num_rings, num_segments))
+    start = len(bm.verts)
+    bm.from_mesh(mesh_rings)
+    bpy.data.meshes.remove(mesh_rings)
+    bm.verts.ensure_lookup_table()
+    bm.edges.ensure_lookup_table()
+    return [bm.verts[start + ring*num_segments:start + (ring + 1)*num_segments] \
+        for ring in range(num_rings)]
+
 def add_circle(bm, radius, num_segments, z):
-    verts_added = []
-    v_prev = None
-    v0 = None    
-    for segment in range(num_segments):
-        theta = (segment / num_segments) * 2 * math.pi
-        v = bm.verts.new(Vector((radius*math.cos(theta), radius*math.sin(theta), z)))
-        verts_added.append(v)
-        if segment == 0:
-            v0 = v
-        if v_prev:
-            bm.edges.new([v_prev, v])
-        if segment == num_segments - 1:
-            bm.edges.new([v, v0])
-        v_prev = v
-    return verts_added
+    return add_circles(bm, [radius], num_segments, [z])[0]
         
 def generate_barrel(context, name, radius_end, radius_mid, height, num_segments, \
     center = Vector((0, 0, 0))):
     bm, barrel_obj = get_placeholder_mesh_obj_and_bm(bpy.context, 'barrel_obj', center)
     
-    bottom_cap_verts = add_circle(bm, radius_end, num_segments, -height/2)
-    add_circle(bm, radius_mid, num_segments, 0)
-    top_cap_verts = add_circle(bm, radius_end, num_segments, height/2)
+    bottom_cap_verts, _, top_cap_verts = add_circles(bm, [radius_end, radius_mid, radius_end], \
+        num_segments, [-height/2, 0, height/2])
     
     bm.faces.new(top_cap_verts)
     bm.faces.new(bottom_cap_verts)
@@ -114,10 +173,192 @@ def generate_barrel(context, name, radius_end, radius_mid, height, num_segments,
     bmesh.update_edit_mesh(barrel_obj.data)
     context.scene.update()    
 
+# Radii of a profile at the given heights. profile is either a callable taking an array 
+# of heights, or one radius per height already sampled.
+def sample_profile(profile, heights):
+    if callable(profile):
+        return np.asarray(profile(heights), dtype = np.float64)
+    return np.asarray(profile, dtype = np.float64)
+
+# Surface of revolution about the z axis as fill_mesh arrays (coords, loop_verts, 
+# loop_totals). One ring of num_segments verts per sampled height is joined to the next 
+# by a band of quads. A zero radius at either end becomes a single pole vert with a 
+# triangle fan, otherwise that end gets an n-gon cap when cap_ends is set. All faces are 
+# wound so their normals point outwards, whichever way the heights run.
+def lathe_arrays(profile, heights, num_segments, cap_ends = True):
+    heights = np.asarray(heights, dtype = np.float64)
+    radii = sample_profile(profile, heights)
+    if len(radii) != len(heights) or len(heights) == 0:
+        raise ValueError("the profile has %d radii for %d heights" % (len(radii), len(heights)))
+    if heights[0] > heights[-1]:
+        heights = heights[::-1]
+        radii = radii[::-1]
+    pole_bottom = radii[0] <= 0
+    pole_top = radii[-1] <= 0
+    ring_slice = slice(1 if pole_bottom else 0, len(radii) - 1 if pole_top else len(radii))
+    num_rings = len(radii[ring_slice])
+    if num_rings < 1:
+        raise ValueError("the profile needs at least one sample with a radius > 0 " \
+            "besides the poles at its ends")
+    n = num_segments
+    
+    coords = [ring_coords(radii[ring_slice], n, heights[ring_slice])]
+    segment = np.arange(n)
+    segment_next = (segment + 1) % n
+    ring_starts = np.arange(num_rings - 1)[:, None]*n
+    quads = np.empty((num_rings - 1, n, 4), dtype = np.int32)
+    quads[..., 0] = ring_starts + segment
+    quads[..., 1] = ring_starts + segment_next
+    quads[..., 2] = ring_starts + n + segment_next
+    quads[..., 3] = ring_starts + n + segment
+    loop_verts = [quads.ravel()]
+    loop_totals = [np.full(quads.shape[0]*n, 4, dtype = np.int32)]
+    
+    top_start = (num_rings - 1)*n
+    pole_index = num_rings*n
+    if pole_bottom:
+        coords.append([[0, 0, heights[0]]])
+        fan = np.column_stack((np.full(n, pole_index), segment_next, segment))
+        loop_verts.append(fan.ravel())
+        loop_totals.append(np.full(n, 3, dtype = np.int32))
+        pole_index += 1
+    elif cap_ends:
+        loop_verts.append(segment[::-1])
+        loop_totals.append([n])
+    if pole_top:
+        coords.append([[0, 0, heights[-1]]])
+        fan = np.column_stack((top_start + segment, top_start + segment_next, np.full(n, pole_index)))
+        loop_verts.append(fan.ravel())
+        loop_totals.append(np.full(n, 3, dtype = np.int32))
+    elif cap_ends:
+        loop_verts.append(top_start + segment)
+        loop_totals.append([n])
+    
+    return np.concatenate(coords).astype(np.float32), \
+        np.concatenate(loop_verts).astype(np.int32), \
+        np.concatenate(loop_totals).astype(np.int32)
+
+# Build a lathed object straight from the arrays: no Edit mode and no operators, so it 
+# also works headless and at any ring/segment density.
+def generate_lathe_obj(context, name, profile, heights, num_segments, cap_ends = True, \
+    location = Vector((0, 0, 0))):
+    mesh = bpy.data.meshes.new(name = name)
+    fill_mesh(mesh, *lathe_arrays(profile, heights, num_segments, cap_ends))
+    obj = bpy.data.objects.new(name = name, object_data = mesh)
+    obj.location = location
+    context.scene.objects.link(obj)
+    context.scene.update()
+    return obj
+
+# Barrel profile bulging from radius_end at the ends to radius_mid half way up, the shape 
+# generate_barrel gets from its three rings plus a smoothed subdivide.
+def barrel_profile(radius_end, radius_mid, height):
+    def profile(z):
+        t = 2*np.asarray(z)/height
+        return radius_mid + (radius_end - radius_mid)*t*t
+    return profile
+
+def generate_barrel_lathe(context, name, radius_end, radius_mid, height, num_segments, \
+    num_rings = 9, center = Vector((0, 0, 0))):
+    heights = np.linspace(-height/2, height/2, num_rings)
+    return generate_lathe_obj(context, name, barrel_profile(radius_end, radius_mid, height), \
+        heights, num_segments, location = center)
+
+# A primitive to instance, as the (coords, loop_verts, loop_totals) arrays of its mesh. 
+# The loops of a mesh aren't necessarily stored in polygon order, so loop_verts is put 
+# in that order (the order fill_mesh writes them in).
+def get_mesh_template(mesh):
+    loop_totals = get_face_loop_totals(mesh)
+    loop_indices = face_loop_indices(get_face_loop_starts(mesh), loop_totals)[0]
+    return get_vert_coords(mesh), get_loop_verts(mesh)[loop_indices], loop_totals
+
+# Template of the default monkey, made with bmesh.ops so no operator or Edit mode is 
+# involved.
+def get_monkey_template():
+    bm = bmesh.new()
+    bmesh.ops.create_monkey(bm)
+    mesh_monkey = bpy.data.meshes.new(name = 'monkey_tmp')
+    bm.to_mesh(mesh_monkey)
+    bm.free()
+    template = get_mesh_template(mesh_monkey)
+    bpy.data.meshes.remove(mesh_monkey)
+    return template
+
+# N x 4 x 4 transforms from N locations, optional XYZ euler rotations in radians and 
+# optional scales (one uniform value or an x/y/z triple per instance), composed in the 
+# same order as Blender's object transform: scale, then rotate, then translate.
+def compose_transforms(locations, rotations = None, scales = None):
+    locations = np.asarray(locations, dtype = np.float32).reshape(-1, 3)
+    count = len(locations)
+    transforms = np.zeros((count, 4, 4), dtype = np.float32)
+    transforms[:, 3, 3] = 1
+    if rotations is None:
+        transforms[:, [0, 1, 2], [0, 1, 2]] = 1
+    else:
+        rotations = np.asarray(rotations, dtype = np.float32).reshape(-1, 3)
+        cx, cy, cz = np.cos(rotations).T
+        sx, sy, sz = np.sin(rotations).T
+        transforms[:, 0, 0] = cy*cz
+        transforms[:, 0, 1] = sx*sy*cz - cx*sz
+        transforms[:, 0, 2] = cx*sy*cz + sx*sz
+        transforms[:, 1, 0] = cy*sz
+        transforms[:, 1, 1] = sx*sy*sz + cx*cz
+        transforms[:, 1, 2] = cx*sy*sz - sx*cz
+        transforms[:, 2, 0] = -sy
+        transforms[:, 2, 1] = sx*cy
+        transforms[:, 2, 2] = cx*cy
+    if scales is not None:
+        scales = np.asarray(scales, dtype = np.float32)
+        scales = scales.reshape(-1, 1) if scales.ndim < 2 else scales
+        transforms[:, :3, :3] *= scales[:, None, :]
+    transforms[:, :3, 3] = locations
+    return transforms
+
+# Instance the template once per transform as one merged set of fill_mesh arrays: all 
+# the verts go through a single batched matmul, and the template's faces are repeated 
+# with each instance's vert indices offset by the template's vert count.
+def instance_arrays(template, transforms):
+    coords, loop_verts, loop_totals = template
+    transforms = np.asarray(transforms, dtype = np.float32).reshape(-1, 4, 4)
+    count = len(transforms)
+    coords_inst = np.matmul(np.asarray(coords, dtype = np.float32), \
+        transforms[:, :3, :3].transpose(0, 2, 1)) + transforms[:, None, :3, 3]
+    offsets = np.arange(count, dtype = np.int32)[:, None]*len(coords)
+    loop_verts_inst = np.asarray(loop_verts, dtype = np.int32)[None, :] + offsets
+    return coords_inst.reshape(-1, 3), loop_verts_inst.ravel(), np.tile(loop_totals, count)
+
+def gen_instanced_mesh_obj(context, name, template, transforms, location = Vector((0, 0, 0))):
+    mesh = bpy.data.meshes.new(name = name)
+    fill_mesh(mesh, *instance_arrays(template, transforms))
+    obj = bpy.data.objects.new(name = name, object_data = mesh)
+    obj.location = location
+    context.scene.objects.link(obj)
+    context.scene.update()
+    return obj
+
+# bmesh_from_scratch's three monkeys, built as one instanced mesh.
+def monkeys_from_scratch_instanced():
+    transforms = compose_transforms([(0, -5, -5), (0, 0, 0), (0, 5, 5)], \
+        rotations = [(0, 0, 0), (0, 0, radians(45)), (0, 0, radians(90))], \
+        scales = [2.5, 2, 1.5])
+    return gen_instanced_mesh_obj(bpy.context, 'from_scratch_instanced', get_monkey_template(), transforms)
+
+def gen_debris_field(context, name, template, count, extent = 100.0, scale_range = (0.1, 0.5), seed = 0):
+    rng = np.random.RandomState(seed)
+    locations = rng.uniform(-extent/2, extent/2, (count, 3))
+    locations[:, 2] *= 0.1
+    rotations = rng.uniform(0, 2*math.pi, (count, 3))
+    scales = rng.uniform(scale_range[0], scale_range[1], count)
+    return gen_instanced_mesh_obj(context, name, template, compose_transforms(locations, rotations, scales))
+
 # Sample Usage
 #bmesh_from_existing()
 #bmesh_from_scratch()
+#monkeys_from_scratch_instanced()
+#gen_debris_field(bpy.context, 'debris', get_monkey_template(), 100000)
 #bmesh_as_sketch_pad()
 generate_barrel(bpy.context, 'test_barrel', radius_end = 3, radius_mid = 5, height = 10, num_segments = 16, center = Vector((0, 0, 5)))
 #generate_barrel(bpy.context, 'test_barrel', radius_end = 3, radius_mid = 5, height = 10, num_segments = 16, center = Vector((4, 7, 9)))
-#generate_barrel(bpy.context, 'test_barrel', radius_end = 5, radius_mid = 2, height = 7, num_segments = 16, center = Vector((0, 0, 5)))
\ No newline at end of file
+#generate_barrel(bpy.context, 'test_barrel', radius_end = 5, radius_mid = 2, height = 7, num_segments = 16, center = Vector((0, 0, 5)))
+#generate_barrel_lathe(bpy.context, 'test_barrel', radius_end = 3, radius_mid = 5, height = 10, num_segments = 10000, num_rings = 65, center = Vector((0, 0, 5)))
+#generate_lathe_obj(bpy.context, 'test_bottle', [0, 2, 2, 1.8, 0.6, 0.6, 0.7], [0, 0.01, 4, 5, 6.5, 8, 8.2], 64, location = Vector((8, 0, 0)))
@@ -0,0 +1,488 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "MeshBuilder",
+    "fire_hydrant_recipe",
+    "fire_hydrant_shape_defaults",
+    "build_fire_hydrant_arrays",
+    "loop_stack_arrays",
+    "cylinder_by_extrusion_recipe",
+    )
+
+# Procedural mesh building on NumPy buffers instead of bmesh + operators. The Ch5 
+# generators are stacks of edge rings: a circle, rings extruded from it, loop cuts 
+# between two rings, bands of faces extruded and pushed along their normals, insets. 
+# MeshBuilder keeps every ring as an (n x 3) array and every stack of bridged rings as 
+# a list of ring ids, so each step is a handful of array operations. The quads between 
+# rings are only generated by build(), which returns flat arrays ready for 
+# Ch6.mesh_arrays.fill_mesh (one foreach_set per attribute). 
+# Every step is also recorded in builder.ops as (name, args) with plain Python values, 
+# and ring ids are handed out in order, so MeshBuilder.from_ops(ops) replays a recipe 
+# anywhere, e.g. in a worker process without bpy. 
+# Nothing here imports bpy.
+
+import numpy as np
+from math import pi
+
+def unit_rows(vecs):
+    lengths = np.sqrt((vecs*vecs).sum(axis = 1))
+    lengths[lengths == 0] = 1
+    return vecs/lengths[:, None]
+
+def as_vector(values):
+    return tuple(float(x) for x in values)
+
+class MeshBuilder:
+    def __init__(self):
+        self.ops = []
+        self.rings = {}
+        self.strips = []
+        self.ring_strip = {}
+        self.caps = []
+        self.collapsed = set()
+        self.face_insets = {}
+        self.next_id = 0
+
+    @classmethod
+    def from_ops(cls, ops):
+        builder = cls()
+        for name, args in ops:
+            getattr(builder, name)(*args)
+        return builder
+
+    def record(self, name, *args):
+        self.ops.append((name, args))
+
+    def new_ring(self, coords):
+        ring = self.next_id
+        self.next_id += 1
+        self.rings[ring] = coords
+        return ring
+
+    def strip_of(self, ring):
+        return self.strips[self.ring_strip[ring]]
+
+    # Ring ids from a to b (inclusive) in stack order, a and b being in the same strip.
+    def ring_range(self, a, b):
+        strip = self.strip_of(a)
+        if self.ring_strip[b] != self.ring_strip[a]:
+            raise ValueError("rings %d and %d are not in the same stack" % (a, b))
+        i, j = strip.index(a), strip.index(b)
+        if i > j:
+            i, j = j, i
+        return strip[i:j + 1]
+
+    def insert_rings(self, strip_index, position, rings):
+        strip = self.strips[strip_index]
+        strip[position:position] = rings
+        for r in rings:
+            self.ring_strip[r] = strip_index
+
+    # Bands of faces that were inset individually can't be cut or extruded any more.
+    def check_band(self, a, b):
+        if (a, b) in self.face_insets or (b, a) in self.face_insets:
+            raise ValueError("band between rings %d and %d is already inset" % (a, b))
+
+    # Start a new stack with a ring of verts around location, laid out like 
+    # bmesh.ops.create_circle: vert k at (radius*sin(phi), radius*cos(phi)).
+    def circle(self, segments, radius, location = (0, 0, 0)):
+        self.record('circle', int(segments), float(radius), as_vector(location))
+        phi = np.arange(segments)*(2*pi/segments)
+        coords = np.empty((segments, 3))
+        coords[:, 0] = radius*np.sin(phi)
+        coords[:, 1] = radius*np.cos(phi)
+        coords[:, 2] = 0
+        coords += location
+        ring = self.new_ring(coords)
+        self.ring_strip[ring] = len(self.strips)
+        self.strips.append([ring])
+        return ring
+
+    # Copy the ring at either end of a stack, move it by offset and scale it about its 
+    # center, and bridge it to the ring it came from.
+    def extrude(self, ring, offset, scale = (1, 1, 1)):
+        self.record('extrude', ring, as_vector(offset), as_vector(scale))
+        strip = self.strip_of(ring)
+        if ring != strip[-1] and ring != strip[0]:
+            raise ValueError("ring %d is not at the end of its stack" % ring)
+        coords = self.rings[ring] + offset
+        center = coords.mean(axis = 0)
+        new_ring = self.new_ring(center + (coords - center)*scale)
+        position = len(strip) if ring == strip[-1] else 0
+        self.insert_rings(self.ring_strip[ring], position, [new_ring])
+        return new_ring
+
+    # Evenly spaced rings between two neighbouring rings a and b, ordered from a to b.
+    def loop_cut(self, a, b, num_cuts):
+        self.record('loop_cut', a, b, int(num_cuts))
+        rings = self.ring_range(a, b)
+        if len(rings) != 2:
+            raise ValueError("rings %d and %d are not neighbours" % (a, b))
+        self.check_band(a, b)
+        first, last = self.rings[rings[0]], self.rings[rings[1]]
+        cuts = []
+        for i in range(1, num_cuts + 1):
+            t = i/(num_cuts + 1)
+            cuts.append(self.new_ring(first*(1 - t) + last*t))
+        strip = self.strip_of(a)
+        self.insert_rings(self.ring_strip[a], strip.index(rings[0]) + 1, cuts)
+        return cuts if rings[0] == a else cuts[::-1]
+
+    # Extrude the band of faces between rings a and b as a region: both boundary rings 
+    # are duplicated and the faces in between move onto the copies, with zero-height 
+    # walls back to the old boundary. Returns the copies of a and b.
+    def extrude_band(self, a, b):
+        self.record('extrude_band', a, b)
+        rings = self.ring_range(a, b)
+        self.check_band(rings[0], rings[1])
+        self.check_band(rings[-2], rings[-1])
+        first = self.new_ring(self.rings[rings[0]].copy())
+        last = self.new_ring(self.rings[rings[-1]].copy())
+        strip_index = self.ring_strip[a]
+        strip = self.strips[strip_index]
+        self.insert_rings(strip_index, strip.index(rings[0]) + 1, [first])
+        self.insert_rings(strip_index, strip.index(rings[-1]), [last])
+        return (first, last) if rings[0] == a else (last, first)
+
+    # Vertex normals of the rings from a to b, pointing away from the stack's axis. Along 
+    # the stack, the nearest ring that doesn't coincide with a ring is used on each side, 
+    # looking only inside the range unless it is a single ring.
+    def ring_normals(self, rings):
+        strip = self.strip_of(rings[0])
+        pool = rings if len(rings) > 1 else strip
+        normals = []
+        for r in rings:
+            coords = self.rings[r]
+            i = pool.index(r)
+            prev_coords = next_coords = coords
+            for p in pool[i - 1::-1] if i > 0 else []:
+                if np.abs(self.rings[p] - coords).max() > 1e-6:
+                    prev_coords = self.rings[p]
+                    break
+            for q in pool[i + 1:]:
+                if np.abs(self.rings[q] - coords).max() > 1e-6:
+                    next_coords = self.rings[q]
+                    break
+            along_ring = np.roll(coords, -1, axis = 0) - np.roll(coords, 1, axis = 0)
+            along_stack = next_coords - prev_coords
+            n = unit_rows(np.cross(along_ring, along_stack))
+            if (n*(coords - coords.mean(axis = 0))).sum() < 0:
+                n = -n
+            normals.append(n)
+        return normals
+
+    # Move the rings from a to b along their normals. Like transform.shrink_fatten, a 
+    # positive value shrinks (moves inwards).
+    def shrink_fatten(self, a, b, value):
+        self.record('shrink_fatten', a, b, float(value))
+        rings = self.ring_range(a, b)
+        for r, n in zip(rings, self.ring_normals(rings)):
+            self.rings[r] = self.rings[r] - n*value
+
+    # Replace ring r with segments + 1 rings rounding off the corner it makes with its 
+    # neighbours, starting and ending offset away from it along the stack.
+    def bevel_ring(self, ring, offset, segments):
+        self.record('bevel_ring', ring, float(offset), int(segments))
+        strip_index = self.ring_strip[ring]
+        strip = self.strips[strip_index]
+        i = strip.index(ring)
+        if i == 0 or i == len(strip) - 1:
+            raise ValueError("ring %d is at the end of its stack" % ring)
+        self.check_band(strip[i - 1], ring)
+        self.check_band(ring, strip[i + 1])
+        corner = self.rings[ring]
+        start = corner + unit_rows(self.rings[strip[i - 1]] - corner)*offset
+        end = corner + unit_rows(self.rings[strip[i + 1]] - corner)*offset
+        new_rings = []
+        for j in range(segments + 1):
+            t = j/segments
+            new_rings.append(self.new_ring(start*(1 - t)*(1 - t) + corner*2*t*(1 - t) + end*t*t))
+        del strip[i]
+        del self.rings[ring]
+        del self.ring_strip[ring]
+        self.insert_rings(strip_index, i, new_rings)
+        return new_rings
+
+    # Inset the band of faces between rings a and b as one region: new boundary rings 
+    # thickness inside a and b along the surface, with everything between them moved 
+    # depth along the normals. Returns the new boundary rings.
+    def inset_band(self, a, b, thickness, depth):
+        self.record('inset_band', a, b, float(thickness), float(depth))
+        rings = self.ring_range(a, b)
+        self.check_band(rings[0], rings[1])
+        self.check_band(rings[-2], rings[-1])
+        first, second = self.rings[rings[0]], self.rings[rings[1]]
+        before_last, last = self.rings[rings[-2]], self.rings[rings[-1]]
+        first_inset = self.new_ring(first + unit_rows(second - first)*thickness)
+        last_inset = self.new_ring(last + unit_rows(before_last - last)*thickness)
+        strip_index = self.ring_strip[a]
+        strip = self.strips[strip_index]
+        self.insert_rings(strip_index, strip.index(rings[0]) + 1, [first_inset])
+        self.insert_rings(strip_index, strip.index(rings[-1]), [last_inset])
+        inner = self.ring_range(first_inset, last_inset)
+        for r, n in zip(inner, self.ring_normals(inner)):
+            self.rings[r] = self.rings[r] + n*depth
+        return (first_inset, last_inset) if rings[0] == a else (last_inset, first_inset)
+
+    # Inset every step-th face (from face start) of the band between neighbouring rings 
+    # a and b on its own, like bmesh.ops.inset_individual. Applied by build().
+    def inset_faces(self, a, b, thickness, depth, start = 0, step = 1):
+        self.record('inset_faces', a, b, float(thickness), float(depth), int(start), int(step))
+        rings = self.ring_range(a, b)
+        if len(rings) != 2:
+            raise ValueError("rings %d and %d are not neighbours" % (a, b))
+        self.check_band(a, b)
+        self.face_insets[tuple(rings)] = (thickness, depth, start, step)
+
+    # Fill a ring at the end of a stack with one n-gon.
+    def cap(self, ring):
+        self.record('cap', ring)
+        self.caps.append(ring)
+
+    # Collapse a ring at the end of a stack into one vert at its center (edge_collapse).
+    def collapse(self, ring):
+        self.record('collapse', ring)
+        strip = self.strip_of(ring)
+        if ring != strip[-1] and ring != strip[0]:
+            raise ValueError("ring %d is not at the end of its stack" % ring)
+        self.rings[ring] = self.rings[ring].mean(axis = 0)[None, :]
+        self.collapsed.add(ring)
+
+    # Inset the faces of one band (an n x 4 array of vert indices) picked by start and 
+    # step. Returns the faces left as they were, the new faces and the new verts, which 
+    # are numbered from first_vert on.
+    def inset_band_faces(self, coords, band, first_vert, thickness, depth, start, step):
+        picked = np.zeros(len(band), dtype = bool)
+        picked[start::step] = True
+        faces = band[picked]
+        corners = coords[faces]
+        to_next = unit_rows((np.roll(corners, -1, axis = 1) - corners).reshape(-1, 3))
+        to_prev = unit_rows((np.roll(corners, 1, axis = 1) - corners).reshape(-1, 3))
+        normals = unit_rows(np.cross(corners[:, 2] - corners[:, 0], corners[:, 3] - corners[:, 1]))
+        inner = corners + ((to_next + to_prev)*thickness).reshape(-1, 4, 3) + \
+            normals[:, None, :]*depth
+        inner_faces = first_vert + np.arange(len(faces)*4).reshape(-1, 4)
+        sides = np.empty((len(faces), 4, 4), dtype = np.int64)
+        sides[:, :, 0] = faces
+        sides[:, :, 1] = np.roll(faces, -1, axis = 1)
+        sides[:, :, 2] = np.roll(inner_faces, -1, axis = 1)
+        sides[:, :, 3] = inner_faces
+        new_faces = np.concatenate((inner_faces, sides.reshape(-1, 4)))
+        return band[~picked], new_faces, inner.reshape(-1, 3)
+
+    # Flat mesh arrays: (coords, loop_verts, loop_totals, edge_verts), where edge_verts 
+    # are the edges of rings that aren't part of any face (None if there are none).
+    def build(self):
+        first_vert = {}
+        num_verts = 0
+        for strip in self.strips:
+            for r in strip:
+                first_vert[r] = num_verts
+                num_verts += len(self.rings[r])
+        coords = [self.rings[r] for strip in self.strips for r in strip]
+        coords = np.concatenate(coords) if coords else np.zeros((0, 3))
+
+        quads, tris, ngons, loose_edges, inset_coords = [], [], [], [], []
+        for strip in self.strips:
+            strip_quads, strip_tris, strip_ngons = [], [], []
+            for a, b in zip(strip[:-1], strip[1:]):
+                if a in self.collapsed or b in self.collapsed:
+                    apex, ring = (a, b) if a in self.collapsed else (b, a)
+                    n = len(self.rings[ring])
+                    k = np.arange(n)
+                    fan = np.empty((n, 3), dtype = np.int64)
+                    fan[:, 0] = first_vert[ring] + k
+                    fan[:, 1] = first_vert[ring] + (k + 1) % n
+                    fan[:, 2] = first_vert[apex]
+                    strip_tris.append(fan if ring == a else fan[:, ::-1])
+                    continue
+                n = len(self.rings[a])
+                k = np.arange(n)
+                band = np.empty((n, 4), dtype = np.int64)
+                band[:, 0] = first_vert[a] + k
+                band[:, 1] = first_vert[a] + (k + 1) % n
+                band[:, 2] = first_vert[b] + (k + 1) % n
+                band[:, 3] = first_vert[b] + k
+                strip_quads.append(((a, b), band))
+            for ring in self.caps:
+                if ring in strip:
+                    cap = first_vert[ring] + np.arange(len(self.rings[ring]))
+                    strip_ngons.append(cap[::-1] if ring == strip[0] and len(strip) > 1 else cap)
+
+            # Wind all faces of the stack so that they face away from its center.
+            faces = [band for key, band in strip_quads] + strip_tris
+            if faces:
+                center = coords[first_vert[strip[0]]:first_vert[strip[-1]] + \
+                    len(self.rings[strip[-1]])].mean(axis = 0)
+                facing = 0.0
+                for f in faces:
+                    corners = coords[f]
+                    n = np.cross(corners[:, 1] - corners[:, 0], corners[:, -1] - corners[:, 0])
+                    facing += (n*(corners.mean(axis = 1) - center)).sum()
+                if facing < 0:
+                    strip_quads = [(key, band[:, ::-1]) for key, band in strip_quads]
+                    strip_tris = [f[:, ::-1] for f in strip_tris]
+                    strip_ngons = [f[::-1] for f in strip_ngons]
+
+            for key, band in strip_quads:
+                if key in self.face_insets:
+                    band, new_faces, new_coords = self.inset_band_faces(coords, band, \
+                        num_verts, *self.face_insets[key])
+                    num_verts += len(new_coords)
+                    quads.append(new_faces)
+                    inset_coords.append(new_coords)
+                quads.append(band)
+            tris.extend(strip_tris)
+            ngons.extend(strip_ngons)
+            if len(strip) == 1 and strip[0] not in self.caps and strip[0] not in self.collapsed:
+                ring = first_vert[strip[0]] + np.arange(len(self.rings[strip[0]]))
+                loose_edges.append(np.column_stack((ring, np.roll(ring, -1))))
+
+        coords = np.concatenate([coords] + inset_coords)
+        loop_verts = [f.ravel() for f in quads + tris] + ngons
+        loop_totals = [np.full(len(f), 4, dtype = np.int32) for f in quads] + \
+            [np.full(len(f), 3, dtype = np.int32) for f in tris] + \
+            [np.array([len(f)], dtype = np.int32) for f in ngons]
+        loop_verts = np.concatenate(loop_verts).astype(np.int32) if loop_verts \
+            else np.zeros(0, dtype = np.int32)
+        loop_totals = np.concatenate(loop_totals) if loop_totals \
+            else np.zeros(0, dtype = np.int32)
+        edge_verts = np.concatenate(loose_edges).astype(np.int32) if loose_edges else None
+        return coords.astype(np.float32), loop_verts, loop_totals, edge_verts
+
+#========= Recipes ===========================================================
+# The sizes follow the bmesh versions in mesh_editing_ops. bmesh.ops.create_circle and 
+# create_cone take their 'diameter' as the radius, so these do too.
+# All rings of a loop stack in one broadcast, as flat mesh arrays (see MeshBuilder.build). 
+# The edges of each ring come first, in bmesh.ops.create_circle's order, and without 
+# bridge fill_mesh keeps them in that order. With bridge, neighbouring rings are joined 
+# by quads facing outwards and mesh.update() derives (and orders) all the edges, so 
+# find edges by their verts then (see get_loop_stack_ref_edges in mesh_editing_ops).
+def loop_stack_arrays(diameter = 2, num_loops = 2, loop_segments = 16, level_height = 1, \
+    bridge = False):
+    phi = np.arange(loop_segments)*(2*pi/loop_segments)
+    coords = np.empty((num_loops, loop_segments, 3))
+    coords[:, :, 0] = diameter*np.sin(phi)
+    coords[:, :, 1] = diameter*np.cos(phi)
+    coords[:, :, 2] = (np.arange(num_loops)*level_height)[:, None]
+
+    ring_start = (np.arange(num_loops)*loop_segments)[:, None]
+    k = np.arange(loop_segments)
+    edge_verts = np.empty((num_loops, loop_segments, 2), dtype = np.int32)
+    edge_verts[:, :, 0] = ring_start + k
+    edge_verts[:, :, 1] = ring_start + (k + 1) % loop_segments
+
+    if bridge and num_loops > 1:
+        faces = np.empty((num_loops - 1, loop_segments, 4), dtype = np.int32)
+        faces[:, :, 0] = edge_verts[:-1, :, 0]
+        faces[:, :, 1] = edge_verts[1:, :, 0]
+        faces[:, :, 2] = edge_verts[1:, :, 1]
+        faces[:, :, 3] = edge_verts[:-1, :, 1]
+        loop_verts = faces.ravel()
+        loop_totals = np.full(len(faces)*loop_segments, 4, dtype = np.int32)
+    else:
+        loop_verts = np.zeros(0, dtype = np.int32)
+        loop_totals = np.zeros(0, dtype = np.int32)
+    return coords.reshape(-1, 3).astype(np.float32), loop_verts, loop_totals, \
+        edge_verts.reshape(-1, 2)
+
+def cylinder_by_extrusion_recipe(diameter = 2, segments = 8, num_levels = 2, level_height = 2):
+    builder = MeshBuilder()
+    ring = builder.circle(segments, diameter)
+    for i in range(num_levels):
+        ring = builder.extrude(ring, (0, 0, level_height))
+    return builder
+
+# The steps of gen_stylized_fire_hydrant on rings. The bevel of the raised band on the 
+# base rounds its two boundary rings only, and the dome panels are inset one face at a 
+# time instead of as column regions.
+def fire_hydrant_recipe(num_cir_segments = 16, pole_diameter = 2, num_pole_levels = 3, \
+    num_dome_levels = 5, stylize = False, pole_bent_factor = 1, dome_bent_factor = 1):
+    builder = MeshBuilder()
+    base_bottom = builder.circle(num_cir_segments, pole_diameter*1.33, \
+        location = (0, 0, -pole_diameter*0.25))
+    base_top = builder.extrude(base_bottom, (0, 0, pole_diameter*0.5))
+    cuts = builder.loop_cut(base_bottom, base_top, 2)
+
+    band_bottom, band_top = builder.extrude_band(cuts[0], cuts[1])
+    builder.shrink_fatten(band_bottom, band_top, -0.1)
+    builder.bevel_ring(band_bottom, 0.05, 2)
+    builder.bevel_ring(band_top, 0.05, 2)
+
+    ring = builder.extrude(base_top, (0, 0, 0))
+    builder.shrink_fatten(ring, ring, pole_diameter*0.33)
+
+    for i in range(num_pole_levels + 1):
+        z_offset = pole_diameter if i < num_pole_levels else pole_diameter*0.5
+        if stylize:
+            skew = pole_diameter*0.25*pole_bent_factor
+            direction = (skew, skew, z_offset) if i % 2 == 0 else (-skew, -skew, z_offset)
+            scale = (0.85, 1, 1) if i % 2 == 0 else (1, 0.85, 1)
+        else:
+            direction = (0, 0, z_offset)
+            scale = (1, 1, 1)
+        prev_ring, ring = ring, builder.extrude(ring, direction, scale)
+        if i == 0:
+            pole_bottom = (prev_ring, ring)
+    pole_top = builder.extrude_band(prev_ring, ring)
+    builder.shrink_fatten(pole_top[0], pole_top[1], pole_diameter*-0.25)
+
+    dome_bands = []
+    cap_bands = []
+    for i in range(num_dome_levels + 3):
+        if i < num_dome_levels:
+            z_offset = pole_diameter*0.5*pow(0.5, i)
+            skew = pole_diameter*0.1*dome_bent_factor if stylize else 0
+            direction = (skew, skew, z_offset) if i % 2 == 0 else (-skew, -skew, z_offset)
+            scale = (0.85, 0.85, 1)
+        else:
+            direction = (0, 0, pole_diameter*0.1)
+            scale = (1, 1, 1)
+        prev_ring, ring = ring, builder.extrude(ring, direction, scale)
+        if i < num_dome_levels:
+            dome_bands.append((prev_ring, ring))
+        else:
+            cap_bands.append((prev_ring, ring))
+    first, last = builder.extrude_band(*cap_bands[1])
+    builder.shrink_fatten(first, last, pole_diameter*-0.1)
+    first, last = builder.extrude_band(*cap_bands[2])
+    builder.shrink_fatten(first, last, pole_diameter*0.15)
+    builder.collapse(ring)
+
+    builder.inset_band(pole_top[0], pole_top[1], 0.3, 0.1)
+    builder.inset_faces(pole_bottom[0], pole_bottom[1], 0.2, -0.1, step = 2)
+    for a, b in dome_bands:
+        builder.inset_faces(a, b, 0.1, -0.15, step = 2)
+    return builder
+
+# The parameters of fire_hydrant_recipe, with their defaults.
+fire_hydrant_shape_defaults = {
+    'num_cir_segments': 16,
+    'pole_diameter': 2,
+    'num_pole_levels': 3,
+    'num_dome_levels': 5,
+    'stylize': False,
+    'pole_bent_factor': 1,
+    'dome_bent_factor': 1,
+    }
+
+# Worker entry point for batch generation: the mesh arrays of one hydrant, from a dict 
+# of fire_hydrant_recipe parameters.
+def build_fire_hydrant_arrays(params):
+    return fire_hydrant_recipe(**params).build()
@@ -22,11 +22,22 @@ __all__ = (
 
 import bpy
 import bmesh
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
 from math import pow
 from mathutils import Vector
+from mathutils.kdtree import KDTree
+
+from Ch5.mesh_builder import *
+from Ch6.adjacency_index import *
+from Ch6.mesh_arrays import *
+from Ch6.topology_arrays import *
+from Ch7.view_fit import *
 
 # ========== Utility Methods ====================================================
-def create_canvas_obj(context, name = 'canvas_obj', location = (0, 0, 0), debug = True):
+def create_canvas_obj(context, name = 'canvas_obj', location = (0, 0, 0), debug = True, \
+    edit_mode = True):
     # Create an object with an empty mesh and link it to the scene.
     mesh = bpy.data.meshes.new(name = name + '_mesh')
     obj = bpy.data.objects.new(name = name, object_data = mesh)
@@ -40,6 +51,11 @@ def create_canvas_obj(context, name = 'canvas_obj', location = (0, 0, 0), debug
         bpy.app.debug = True
         mesh.show_extra_indices = True
 
+    # Without edit_mode the mesh can be filled from arrays first; bm is None then.
+    bm = edit_obj_bmesh(context, obj) if edit_mode else None
+    return obj, bm
+
+def edit_obj_bmesh(context, obj):
     if context.scene.objects.active is not None and \
         context.scene.objects.active.mode == 'EDIT':
         bpy.ops.object.mode_set(mode='OBJECT')
@@ -49,9 +65,33 @@ def create_canvas_obj(context, name = 'canvas_obj', location = (0, 0, 0), debug
     bpy.ops.object.mode_set(mode = 'EDIT')
     bm = bmesh.from_edit_mesh(obj.data)
     
-    return obj, bm
-        
+    return bm
+
+# All rings are built in one go by loop_stack_arrays and written with fill_mesh before 
+# switching to Edit mode (skipped with edit_mode = False, bm is None then). With bridge, 
+# the rings come out already joined by faces.
 def create_loop_stack(context, name = 'loop_stack', location = (0, 0, 0), debug = False, \
+    diameter = 2, num_loops = 2, loop_segments = 16, level_height = 1, bridge = False, \
+    edit_mode = True):
+    loop_obj, bm = create_canvas_obj(context, name, location, debug, edit_mode = False)
+    coords, loop_verts, loop_totals, edge_verts = loop_stack_arrays(diameter, num_loops, \
+        loop_segments, level_height, bridge)
+    fill_mesh(loop_obj.data, coords, loop_verts, loop_totals, edge_verts)
+
+    if edit_mode:
+        bm = edit_obj_bmesh(context, loop_obj)
+        bm.edges.ensure_lookup_table()
+    
+    return loop_obj, bm
+
+# First edge of each ring of a loop stack, looked up by its verts (each ring's first two 
+# verts), so it doesn't depend on the order the edges were written in.
+def get_loop_stack_ref_edges(bm, num_loops, loop_segments):
+    bm.verts.ensure_lookup_table()
+    return [bm.edges.get((bm.verts[i*loop_segments], bm.verts[i*loop_segments + 1])) \
+        for i in range(num_loops)]
+
+def create_loop_stack_bmesh(context, name = 'loop_stack', location = (0, 0, 0), debug = False, \
     diameter = 2, num_loops = 2, loop_segments = 16, level_height = 1):
     loop_obj, bm = create_canvas_obj(context, name, location, debug)
     
@@ -131,38 +171,145 @@ def test_create_grid_bmesh():
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
 
+def test_create_loop_stack_bridged():
+    obj, bm = create_loop_stack(bpy.context, name = 'tube_scaffold', location = (8, 0, 0), \
+        diameter = 1, num_loops = 1000, loop_segments = 32, level_height = 0.05, \
+        bridge = True, edit_mode = False)
+    bpy.context.scene.update()
+
 def test_create_loop_stack():
     obj, bm = create_loop_stack(bpy.context, name = 'loop_stack', location = (0, 0, 0), \
         debug = True, diameter = 3, num_loops = 5, loop_segments = 8, level_height = 2)
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
 
+#========= Walking Edge Loops + Rings ========================
+# The walkers follow the live BMesh link lists rather than the AdjacencyIndex of Ch6: 
+# they run in between bmesh edits, where the index would have to be rebuilt from the 
+# mesh data every time.
+# Next edge of the edge loop that arrives at vert v through edge e, or None if the loop 
+# ends at v. Mirrors what loop_multi_select does:
+# - wire edges continue through verts that have exactly two edges,
+# - boundary edges continue along the boundary (the rim of a grid or an open cylinder),
+# - an edge between two faces continues straight across a vert with four edges (the one 
+#   edge at v that shares no face with e), or, at a vert with three edges, around the 
+#   rim of an ngon (e.g. the cap of a cylinder).
+def next_loop_edge(e, v):
+    faces = list(e.link_faces)
+    others = [oe for oe in v.link_edges if oe != e]
+    if len(faces) == 0:
+        if len(others) == 1 and len(others[0].link_faces) == 0:
+            return others[0]
+    elif len(faces) == 1:
+        boundary = [oe for oe in others if len(oe.link_faces) == 1]
+        if len(others) <= 2 and len(boundary) == 1:
+            return boundary[0]
+    elif len(faces) == 2:
+        if len(others) == 3:
+            across = [oe for oe in others if not any(f in faces for f in oe.link_faces)]
+            if len(across) == 1:
+                return across[0]
+        elif len(others) == 2:
+            for f in faces:
+                if len(f.verts) > 4:
+                    for oe in others:
+                        if f in oe.link_faces:
+                            return oe
+    return None
+
+# Walk from e through v until the loop ends or closes. Returns the edges and verts 
+# visited after e (in order), and whether the loop came back around to e.
+def walk_loop_from(e, v):
+    edges = []
+    verts = [v]
+    visited = set([e])
+    cur = e
+    while True:
+        nxt = next_loop_edge(cur, v)
+        if nxt is None or nxt in visited:
+            return edges, verts, nxt == e
+        visited.add(nxt)
+        edges.append(nxt)
+        v = nxt.other_vert(v)
+        verts.append(v)
+        cur = nxt
+
+# Ordered edges and verts of the edge loop through e.
+def walk_edge_loop(e):
+    fwd_edges, fwd_verts, closed = walk_loop_from(e, e.verts[1])
+    if closed:
+        return [e] + fwd_edges, [e.verts[0]] + fwd_verts[:-1]
+    back_edges, back_verts, _ = walk_loop_from(e, e.verts[0])
+    return back_edges[::-1] + [e] + fwd_edges, back_verts[::-1] + fwd_verts
+
+# Walk the ring from loop l across quads until it hits a non-quad, the boundary, or 
+# comes back to l.edge. a is the vert of l.edge on the "a" side of the ring. Returns the 
+# edges after l.edge, their (a, b) vert pairs, and whether the ring closed.
+def walk_ring_from(l, a):
+    e = l.edge
+    edges = []
+    vert_pairs = []
+    visited = set([e])
+    while len(l.face.verts) == 4:
+        # l runs from l.vert to the next vert; the opposite loop runs the other way.
+        opposite = l.link_loop_next.link_loop_next
+        if opposite.edge in visited:
+            return edges, vert_pairs, opposite.edge == e
+        visited.add(opposite.edge)
+        if l.vert == a:
+            a, b = opposite.link_loop_next.vert, opposite.vert
+        else:
+            a, b = opposite.vert, opposite.link_loop_next.vert
+        edges.append(opposite.edge)
+        vert_pairs.append((a, b))
+        l = opposite.link_loop_radial_next
+        if l == opposite:
+            break
+    return edges, vert_pairs, False
+
+# Ordered edges of the edge ring through e, plus their verts as [a0, b0, a1, b1, ...] 
+# with all the a's on the same side of the ring.
+def walk_edge_ring(e):
+    a, b = e.verts[0], e.verts[1]
+    loops = list(e.link_loops)
+    if len(loops) == 0:
+        return [e], [a, b]
+    fwd_edges, fwd_pairs, closed = walk_ring_from(loops[0], a)
+    back_edges, back_pairs = [], []
+    if not closed and len(loops) == 2:
+        back_edges, back_pairs, _ = walk_ring_from(loops[1], a)
+    pairs = back_pairs[::-1] + [(a, b)] + fwd_pairs
+    return back_edges[::-1] + [e] + fwd_edges, [v for pair in pairs for v in pair]
+
+# Walk the edge loops (or rings) of many reference edges in one pass. A reference edge 
+# that lies on a loop found earlier reuses that loop instead of walking it again. 
+# Returns one (edges, verts) pair per reference edge.
+def walk_edge_loops(ref_edges, rings = False):
+    walk = walk_edge_ring if rings else walk_edge_loop
+    found = {}
+    results = []
+    for re in ref_edges:
+        if re not in found:
+            loop = walk(re)
+            for e in loop[0]:
+                found[e] = loop
+        results.append(found[re])
+    return results
+
 #========= Selecting Edge Loops =============================
 def get_edge_loops(bm, ref_edges, select_rings = False):
-    loops = []
-    for re in ref_edges:
-        bpy.ops.mesh.select_all(action = 'DESELECT')
-        re.select = True
-        bpy.ops.mesh.loop_multi_select(ring = select_rings)
-        this_loop = []
-        for e in bm.edges:
-            if e.select:
-                this_loop.append(e)
-        loops.append(this_loop)
-    bpy.ops.mesh.select_all(action = 'DESELECT')
-    return loops
+    return [edges for edges, verts in walk_edge_loops(ref_edges, rings = select_rings)]
 
 def select_edge_loops(bm, ref_edges, select_rings = False):
     bpy.ops.mesh.select_all(action = 'DESELECT')
-    for re in ref_edges:
-        re.select = True
-    bpy.ops.mesh.loop_multi_select(ring = select_rings)
-    
-    loop_edges = []  
-    for e in bm.edges:
-        if e.select:
-            loop_edges.append(e)
-        
+    loop_edges = []
+    seen = set()
+    for edges, verts in walk_edge_loops(ref_edges, rings = select_rings):
+        for e in edges:
+            if e not in seen:
+                seen.add(e)
+                e.select = True
+                loop_edges.append(e)
     return loop_edges
 
 #============ Test Selecting Loops =========================================
@@ -185,7 +332,13 @@ def test_get_edge_loops(bm):
 
 #========= Bridging Edge Loops ===============================
 def bridge_loops(bm, ref_edges):
-    edges_in_loops = select_edge_loops(bm, ref_edges)
+    edges_in_loops = []
+    seen = set()
+    for edges, verts in walk_edge_loops(ref_edges):
+        for e in edges:
+            if e not in seen:
+                seen.add(e)
+                edges_in_loops.append(e)
     new_geom = bmesh.ops.bridge_loops(bm, edges = edges_in_loops)
     return new_geom['faces'], new_geom['edges']
 
@@ -200,7 +353,7 @@ def test_bridge_loops():
     stack_obj, bm = create_loop_stack(bpy.context, name = 'test_bridge_loops', \
         location = (0, 0, 0), debug = True, diameter = 3, num_loops = num_loops, \
         loop_segments = num_segments, level_height = 2)
-    loop_ref_edges = [bm.edges[i*num_segments] for i in range(num_loops)]
+    loop_ref_edges = get_loop_stack_ref_edges(bm, num_loops, num_segments)
     
     resulted_faces, resulted_edges = bridge_loops(bm, loop_ref_edges)
     print(str([f.index for f in resulted_faces]))
@@ -214,7 +367,30 @@ def test_bridge_loops():
     #loop_cut_slide(bpy.context, ref_edge = loop_ref_edges[0], num_cuts = 3, slide_distance = 0.25)
 
 #========= Extrusion =========================================
+# Copy the edge loop through ref_edge, move the copy by direction, scale it by 
+# scale_factor about its own center (same as duplicate + translate + resize with the 
+# median point as pivot), and bridge the two loops. Everything happens on bm with 
+# bmesh.ops and NumPy, so no viewport or selection is needed. Returns the edges of the 
+# new loop (in loop order) and the faces created by the bridge.
+def extrude_edge_loop_copy_move_bmesh(bm, ref_edge, direction, scale_factor):
+    loop_edges, loop_verts = walk_edge_loop(ref_edge)
+    dup = bmesh.ops.duplicate(bm, geom = loop_verts + loop_edges)
+    new_verts = [dup['vert_map'][v] for v in loop_verts]
+    new_edges = [dup['edge_map'][e] for e in loop_edges]
+
+    co = np.array([v.co for v in loop_verts], dtype = np.float64) + np.array(direction)
+    center = co.mean(axis = 0)
+    co = center + (co - center)*np.array(scale_factor)
+    for v, new_co in zip(new_verts, co):
+        v.co = new_co
+
+    bridged = bmesh.ops.bridge_loops(bm, edges = loop_edges + new_edges)
+    return new_edges, bridged['faces']
+
 def extrude_edge_loop_copy_move(bm, ref_edge, direction, scale_factor):
+    return extrude_edge_loop_copy_move_bmesh(bm, ref_edge, direction, scale_factor)[0]
+
+def extrude_edge_loop_copy_move_bpy(bm, ref_edge, direction, scale_factor):
     select_edge_loops(bm, [ref_edge], select_rings = False)
     bpy.ops.mesh.duplicate()
     bpy.ops.transform.translate(value = direction)
@@ -232,6 +408,49 @@ def loop_extrude_region_move(bm, ref_edge, direction):
     select_edge_loops(bm, [ref_edge], select_rings = False)
     bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate={"value": direction})
 
+# extrude_region_move of a face selection followed by shrink_fatten, without operators: 
+# the faces are extruded as one region and the new verts move along the normals of 
+# the extruded faces they belong to (a positive value shrinks, as in shrink_fatten). 
+# Returns the extruded faces.
+def extrude_faces_shrink_fatten_bmesh(bm, faces, value):
+    result = bmesh.ops.extrude_face_region(bm, geom = faces)
+    new_verts = [g for g in result['geom'] if isinstance(g, bmesh.types.BMVert)]
+    new_vert_set = set(new_verts)
+    new_faces = [g for g in result['geom'] if isinstance(g, bmesh.types.BMFace) and \
+        all(v in new_vert_set for v in g.verts)]
+    new_face_set = set(new_faces)
+    for f in new_faces:
+        f.normal_update()
+    normals = np.array([sum((f.normal for f in v.link_faces if f in new_face_set), \
+        Vector((0, 0, 0))).normalized() for v in new_verts])
+    co = np.array([v.co for v in new_verts])
+    for v, new_co in zip(new_verts, co - normals*value):
+        v.co = new_co
+    return new_faces
+
+# Same for an edge loop (extrude_region_move in edge select mode): the new verts move 
+# along the normals of the verts they were extruded from. Returns the new edges.
+def extrude_edges_shrink_fatten_bmesh(bm, edges, value):
+    bm.normal_update()
+    old_verts = set(v for e in edges for v in e.verts)
+    result = bmesh.ops.extrude_edge_only(bm, edges = edges)
+    new_verts = [g for g in result['geom'] if isinstance(g, bmesh.types.BMVert)]
+    new_vert_set = set(new_verts)
+    for v in new_verts:
+        for e in v.link_edges:
+            old_v = e.other_vert(v)
+            if old_v in old_verts:
+                v.co = old_v.co - old_v.normal*value
+                break
+    return [g for g in result['geom'] if isinstance(g, bmesh.types.BMEdge) and \
+        all(v in new_vert_set for v in g.verts)]
+
+# edge_collapse of an edge loop: merge its verts into one at their center.
+def collapse_edge_loop_bmesh(bm, ref_edge):
+    edges, verts = walk_edge_loop(ref_edge)
+    center = sum((v.co for v in verts), Vector((0, 0, 0)))/len(verts)
+    bmesh.ops.pointmerge(bm, verts = verts, merge_co = center)
+
 #============== Test Extrusion ========================================================== 
 def test_extrude_before():
     segments = 8    
@@ -272,24 +491,90 @@ def loop_slide(context, bm, ref_edge, slide_distance):
     bpy.ops.transform.edge_slide(get_context_override(context, 'VIEW_3D', 'WINDOW'), \
         value = slide_distance)
 
-def get_context_override(context, area_type, region_type):
-    override = context.copy()
-    for area in override['screen'].areas:
-        if area.type == area_type: # e.g. 'VIEW_3D' for viewport, 'IMAGE_EDITOR' for UV/Image Editor, etc.
-            override['area'] = area
-            break
-    for region in override['area'].regions:
-        if region.type == region_type: # e.g. 'WINDOW'
-            override['region'] = region
-            break
-    return override
-    
 def loop_cut_slide(context, ref_edge, num_cuts, slide_distance):
     # reference_edge is the edge closest and perpendicular to where the loop cut should be made.
     bpy.ops.mesh.loopcut_slide(get_context_override(context, 'VIEW_3D', 'WINDOW'), \
         MESH_OT_loopcut={"number_cuts": num_cuts, "edge_index": ref_edge.index}, \
         TRANSFORM_OT_edge_slide={"value": slide_distance})
 
+# Move every verts[i] the fraction value of the way to to_verts[i] (value > 0) or to 
+# from_verts[i] (value < 0), all computed from the old positions at once, the way 
+# transform.edge_slide moves verts along their rail edges.
+def slide_verts(verts, from_verts, to_verts, value):
+    if value == 0 or len(verts) == 0:
+        return
+    co = np.array([v.co for v in verts])
+    rail_co = np.array([v.co for v in (to_verts if value > 0 else from_verts)])
+    for v, new_co in zip(verts, co + (rail_co - co)*abs(value)):
+        v.co = new_co
+
+# The verts of the edge loop through ref_edge and, on either side of the loop, the vert 
+# each of them is connected to across the neighbouring edge ring (or the vert itself 
+# where there is none, e.g. on a boundary loop).
+def get_loop_rails(ref_edge):
+    loop_edges, loop_verts = walk_edge_loop(ref_edge)
+    loop_edge_set = set(loop_edges)
+    sides = []
+    for e in loop_verts[0].link_edges:
+        if e in loop_edge_set or len(sides) == 2:
+            continue
+        ring_edges, ring_verts = walk_edge_ring(e)
+        across = {}
+        for a, b in zip(ring_verts[0::2], ring_verts[1::2]):
+            across[a] = b
+            across[b] = a
+        sides.append([across.get(v, v) for v in loop_verts])
+    while len(sides) < 2:
+        sides.append(list(loop_verts))
+    return loop_verts, sides[0], sides[1]
+
+# Same as loop_slide without operators or a viewport.
+def loop_slide_bmesh(bm, ref_edge, slide_distance):
+    verts, side_a, side_b = get_loop_rails(ref_edge)
+    slide_verts(verts, side_a, side_b, slide_distance)
+
+# The verts along edge (a, b) after it was cut into num_cuts + 1 pieces, from a to b. 
+# At each step the next vert is the new one lying straight ahead towards b.
+def get_cut_chain(a, b, new_verts, num_cuts):
+    direction = b.co - a.co
+    chain = [a]
+    for i in range(num_cuts):
+        cur = chain[-1]
+        ahead = [e.other_vert(cur) for e in cur.link_edges if e.other_vert(cur) in new_verts]
+        chain.append(max(ahead, key = lambda v: (v.co - cur.co).normalized().dot(direction)))
+    chain.append(b)
+    return chain
+
+# Same as loop_cut_slide without operators or a viewport: one subdivide_edges call cuts 
+# every edge of the ring through ref_edge and connects the cuts across its faces (with 
+# the grid fill loopcut_slide uses), then the new loops are slid along the ring edges. 
+# Returns the new edge loops in order from the 'a' side of the ring (see walk_edge_ring).
+def loop_cut_slide_bmesh(bm, ref_edge, num_cuts, slide_distance = 0):
+    ring_edges, ring_verts = walk_edge_ring(ref_edge)
+    num_verts = len(bm.verts)
+    bmesh.ops.subdivide_edges(bm, edges = ring_edges, cuts = num_cuts, use_grid_fill = True)
+    bm.verts.ensure_lookup_table()
+    new_verts = set(bm.verts[num_verts:])
+    chains = [get_cut_chain(a, b, new_verts, num_cuts) \
+        for a, b in zip(ring_verts[0::2], ring_verts[1::2])]
+
+    cut_verts, from_verts, to_verts = [], [], []
+    for chain in chains:
+        cut_verts.extend(chain[1:-1])
+        from_verts.extend(chain[:-2])
+        to_verts.extend(chain[2:])
+    slide_verts(cut_verts, from_verts, to_verts, slide_distance)
+
+    loops = []
+    for i in range(1, num_cuts + 1):
+        loop = []
+        for chain, next_chain in zip(chains, chains[1:] + chains[:1]):
+            e = bm.edges.get((chain[i], next_chain[i])) if chain is not next_chain else None
+            if e is not None and (len(loop) == 0 or e != loop[0]):
+                loop.append(e)
+        loops.append(loop)
+    return loops
+
 #=========== Test Loop Cuts + Slides =========================================================
 def test_loop_cut_slide_before():
     obj, bm, loops = create_cylinder_by_extrusion(bpy.context, name = 'test_loop_cut_slide_before', location = (0, 7, 0), debug = True, diameter = 2, segments = 8)
@@ -303,7 +588,7 @@ def test_loop_slide():
     stack_obj, bm = create_loop_stack(bpy.context, name = 'test_bridge_loops', \
         location = (0, 0, 0), debug = True, diameter = 3, num_loops = num_loops, \
         loop_segments = num_segments, level_height = 2)
-    loop_ref_edges = [bm.edges[i*num_segments] for i in range(num_loops)]
+    loop_ref_edges = get_loop_stack_ref_edges(bm, num_loops, num_segments)
     resulted_faces, resulted_edges = bridge_loops(bm, loop_ref_edges)
 
     loop_slide(bpy.context, bm, ref_edge = loop_ref_edges[1], slide_distance = 0.5)
@@ -312,6 +597,14 @@ def test_loop_slide():
     bmesh.update_edit_mesh(stack_obj.data)
     bpy.context.scene.update()
 
+def test_loop_cut_slide_bmesh():
+    obj, bm, loops = create_cylinder_by_extrusion(bpy.context, name = 'test_loop_cut_slide_bmesh', \
+        location = (0, 7, 0), debug = True, diameter = 2, segments = 8)
+    cut_loops = loop_cut_slide_bmesh(bm, loops[0][0], num_cuts = 2, slide_distance = 0.5)
+    loop_slide_bmesh(bm, cut_loops[0][0], -0.5)
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
+
 def test_loop_cut_slide():
     obj, bm, loops = create_cylinder_by_extrusion(bpy.context, name = 'test_loop_cut_slide', location = (0, -7, 0), debug = True, diameter = 2, segments = 8)
     loop_cut_slide(bpy.context, ref_edge = loops[0][0], num_cuts = 2, slide_distance = 0.5)
@@ -333,6 +626,81 @@ def merge_verts_bpy(target_map, merge_type = 'CENTER'):
         # type is: 'CENTER', 'CURSOR', or 'COLLAPSE'
         bpy.ops.mesh.merge(type = merge_type)
 
+# The 3D cursor in the object space of obj (the object in Edit mode, or else the active 
+# one, when obj is None). Without any object it stays in world space.
+def get_cursor_location_local(context, obj = None):
+    if obj is None:
+        obj = context.edit_object or context.active_object
+    if obj is None:
+        return context.scene.cursor_location.copy()
+    return obj.matrix_world.inverted()*context.scene.cursor_location
+
+# Same as merge_verts_bpy, as a single bmesh.ops.weld_verts over the whole map. 
+# The merged verts end up where mesh.merge would put them: at the center of each target 
+# and all the verts mapped to it ('CENTER'), at the 3D cursor ('CURSOR', in object 
+# space; defaults to the scene's cursor) or at the target ('COLLAPSE').
+def merge_verts_bmesh(bm, target_map, merge_type = 'CENTER', cursor_location = None):
+    if merge_type == 'CENTER':
+        sums = {}
+        for v_from, v_to in target_map.items():
+            if v_to not in sums:
+                sums[v_to] = [v_to.co.copy(), 1]
+            sums[v_to][0] += v_from.co
+            sums[v_to][1] += 1
+        for v_to, (co_sum, count) in sums.items():
+            v_to.co = co_sum/count
+    elif merge_type == 'CURSOR':
+        if cursor_location is None:
+            cursor_location = get_cursor_location_local(bpy.context)
+        for v_to in set(target_map.values()):
+            v_to.co = cursor_location
+    bmesh.ops.weld_verts(bm, targetmap = target_map)
+
+def build_kdtree(verts):
+    kd = KDTree(len(verts))
+    for i, v in enumerate(verts):
+        kd.insert(v.co, i)
+    kd.balance()
+    return kd
+
+# Map every vert that lies within distance of an earlier vert in the list to that vert, 
+# for weld_verts. A vert that is already mapped is never used as a target, so the 
+# map has no chains.
+def find_merge_targets(verts, distance):
+    kd = build_kdtree(verts)
+    merged = np.zeros(len(verts), dtype = bool)
+    target_map = {}
+    for i, v in enumerate(verts):
+        if merged[i]:
+            continue
+        for co, j, dist in kd.find_range(v.co, distance):
+            if j > i and not merged[j]:
+                merged[j] = True
+                target_map[verts[j]] = v
+    return target_map
+
+# Map every source vert to the nearest target vert (optionally only those within 
+# distance), for weld_verts.
+def find_nearest_targets(source_verts, target_verts, distance = None):
+    kd = build_kdtree(target_verts)
+    target_map = {}
+    for v in source_verts:
+        co, j, dist = kd.find(v.co)
+        if j is None or (distance is not None and dist > distance):
+            continue
+        if target_verts[j] is not v:
+            target_map[v] = target_verts[j]
+    return target_map
+
+# Remove doubles: weld the verts (all of bm's by default) that are within distance of 
+# each other in a single weld_verts. Returns the number of verts removed.
+def merge_by_distance_bmesh(bm, distance = 0.0001, verts = None):
+    verts = list(bm.verts) if verts is None else list(verts)
+    target_map = find_merge_targets(verts, distance)
+    if target_map:
+        bmesh.ops.weld_verts(bm, targetmap = target_map)
+    return len(target_map)
+
 #=========== Test Merging Verts=============================================================
 def test_merge_verts_before():
     obj, bm = create_grid_bmesh(bpy.context, name = 'test_merge_verts_before', location = (5, 0, 0), \
@@ -350,8 +718,7 @@ def test_merge_verts():
     from_list = [bm.verts[i] for i in range(1, 4, 1)]
     to_list = [bm.verts[i] for i in range(6, 9, 1)]
     target_map = {from_list[i]: to_list[i] for i in range(3)}
-    #bmesh.ops.weld_verts(bm, targetmap = target_map)
-    merge_verts_bpy(target_map, merge_type = 'CENTER')
+    merge_verts_bmesh(bm, target_map, merge_type = 'CENTER')
     
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
@@ -371,7 +738,23 @@ def test_merge_verts_bpy():
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
         
-def merge_vert_loops(bm, vert_loop_source, vert_loop_target):
+def test_merge_by_distance():
+    obj, bm = create_grid_bmesh(bpy.context, name = 'test_merge_by_distance', \
+        location = (0, 10, 0), debug = False, x_segments = 50, y_segments = 50, size = 3)
+    bmesh.ops.duplicate(bm, geom = bm.faces[:])
+    num_removed = merge_by_distance_bmesh(bm, distance = 0.001)
+    print('Removed {} doubles'.format(num_removed))
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
+
+# Weld the source loop onto the target loop. match = 'INDEX' pairs the verts by their 
+# position in the lists, 'NEAREST' welds every source vert to the closest target vert.
+def merge_vert_loops(bm, vert_loop_source, vert_loop_target, match = 'INDEX'):
+    if match == 'NEAREST':
+        bmesh.ops.weld_verts(bm, targetmap = find_nearest_targets(vert_loop_source, \
+            vert_loop_target))
+        return vert_loop_target, [v.index for v in vert_loop_target]
+
     tm = dict()
     len_source = len(vert_loop_source)
     len_target = len(vert_loop_target)
@@ -408,6 +791,17 @@ def test_merge_vert_loops_reverse():
     merge_vert_loops(bm, odd_verts, even_verts)
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
+
+def test_merge_vert_loops_nearest():
+    segments = 8    
+    obj, bm = create_cylinder_bmesh(bpy.context, name = 'merged_nearest', location = (0, -8, 0), debug = True, diameter1 = 2, diameter2 = 1, segments = segments, height = 2)
+    bpy.context.tool_settings.mesh_select_mode = [True, False, False]
+    bm.verts.ensure_lookup_table()
+    even_verts = [bm.verts[i] for i in range(0, segments*2, 2)]
+    odd_verts = [bm.verts[i] for i in range(1, segments*2, 2)]
+    merge_vert_loops(bm, even_verts, odd_verts[::-1], match = 'NEAREST')
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
     
 # ========== Ripping Verts ======================================================
 def rip_verts_bmesh(rip_map, offset):
@@ -418,6 +812,25 @@ def rip_verts_bmesh(rip_map, offset):
         ripped_verts.append(v)
     return ripped_verts
 
+# Indices of bmesh elements, refreshed first since the ops below add elements.
+def element_indices(seq, elements):
+    seq.index_update()
+    return np.array([e.index for e in elements], dtype = np.int32)
+
+# Batch version of rip_verts_bmesh: rip corner corner_indices[i] off face 
+# face_indices[i] and move it by offset. bmesh has no operator that separates 
+# face corners, so this still goes corner by corner, but needs no face map and 
+# returns the indices of the new verts.
+def rip_corners_bmesh(bm, face_indices, corner_indices, offset):
+    bm.faces.ensure_lookup_table()
+    faces = [bm.faces[i] for i in face_indices]
+    ripped_verts = []
+    for f, corner in zip(faces, corner_indices):
+        v = bmesh.utils.face_vert_separate(f, f.verts[corner])
+        v.co += offset
+        ripped_verts.append(v)
+    return element_indices(bm.verts, ripped_verts)
+
 #=========== Test Ripping =============================================================
 def test_rip_verts_before():
     obj, bm = create_grid_bmesh(bpy.context, name = 'test_rip_verts_before', location = (7, 0, 0), debug = True, x_segments = 10, y_segments = 4, size = 6)
@@ -437,6 +850,14 @@ def test_rip_verts_bmesh():
     
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
+
+def test_rip_corners_bmesh():
+    obj, bm = create_grid_bmesh(bpy.context, name = 'test_rip_corners_bmesh', \
+        location = (-7, 8, 0), debug = True, x_segments = 10, y_segments = 4, size = 6)
+    rip_corners_bmesh(bm, np.array([10, 12, 14, 16]), np.array([0, 1, 2, 3]), \
+        Vector((1, 0.75, 1.25)))
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
     
 def test_rip_verts():
     test_rip_verts_before()
@@ -450,6 +871,32 @@ def bevel_bpy(edge_list, offset = 0.15, segments = 2, loop_slide = True, vertex_
     bpy.ops.mesh.bevel(offset = offset, segments = segments, loop_slide = loop_slide, \
         vertex_only = vertex_only)
 
+# Inset the faces with the given indices in one inset_region (or inset_individual) 
+# call. Returns the indices of the inset faces and of the new faces around them.
+def inset_faces_bmesh(bm, face_indices, thickness, depth, individual = False):
+    bm.faces.ensure_lookup_table()
+    faces = [bm.faces[i] for i in face_indices]
+    if individual:
+        result = bmesh.ops.inset_individual(bm, faces = faces, thickness = thickness, \
+            depth = depth)
+    else:
+        result = bmesh.ops.inset_region(bm, faces = faces, thickness = thickness, depth = depth)
+    return element_indices(bm.faces, faces), element_indices(bm.faces, result['faces'])
+
+# Same as bevel_bpy on the edges with the given indices, in one bmesh.ops.bevel call 
+# that doesn't touch the selection. bmesh.ops.bevel defaults profile to 0 where 
+# bpy.ops.mesh.bevel uses 0.5 (round), so the operator's default is passed explicitly. 
+# Returns the indices of the new faces.
+def bevel_edges_bmesh(bm, edge_indices, offset = 0.15, segments = 2, loop_slide = True, \
+    vertex_only = False, profile = 0.5):
+    bm.edges.ensure_lookup_table()
+    edges = [bm.edges[i] for i in edge_indices]
+    verts = list({v for e in edges for v in e.verts})
+    geom = verts if vertex_only else edges + verts
+    result = bmesh.ops.bevel(bm, geom = geom, offset = offset, segments = segments, \
+        vertex_only = vertex_only, profile = profile, loop_slide = loop_slide)
+    return element_indices(bm.faces, result['faces'])
+
 #========= Test Insettting ========================================================
 def test_inset_bmesh_before():
     obj, bm = create_grid_bmesh(bpy.context, name = 'test_inset_before', location = (0, 0, 2), \
@@ -478,6 +925,17 @@ def test_inset_bmesh():
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
 
+def test_inset_faces_bmesh():
+    obj, bm = create_grid_bmesh(bpy.context, name = 'test_inset_faces_bmesh', \
+        location = (0, 8, 2), debug = True, x_segments = 10, y_segments = 4, size = 6)
+    inner, sides = inset_faces_bmesh(bm, np.arange(0, 4), thickness = 0.3, depth = 0.5, \
+        individual = True)
+    inner, sides = inset_faces_bmesh(bm, np.r_[9:12, 14:18], thickness = 0.3, depth = 0.5)
+    # The returned indices feed the next step directly.
+    inset_faces_bmesh(bm, inner, thickness = 0.1, depth = -0.2)
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
+
 def test_inset():
     test_inset_bmesh_before()
     test_inset_bmesh()
@@ -517,6 +975,13 @@ def test_bevel_bpy_vertex_only():
     bmesh.update_edit_mesh(obj.data)
     bpy.context.scene.update()
     
+def test_bevel_edges_bmesh():
+    obj, bm = create_cube_bmesh(bpy.context, name = 'test_bevel_edges_bmesh', \
+        location = (6, 0, 3), debug = False, size = 5.0)
+    bevel_edges_bmesh(bm, np.arange(0, 4), offset = 1.0, segments = 5)
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
+
 def test_bevel_bpy():
     test_bevel_bpy_before()
     test_bevel_bpy_edges()
@@ -524,15 +989,63 @@ def test_bevel_bpy():
     test_bevel_bpy_vertex_only()
        
 # ========== Remove Loose Verts =================================================       
-def remove_loose_verts(bm):
+# Pass the object bm belongs to in order to find the loose verts from its 
+# adjacency index instead of walking v.link_edges.
+def remove_loose_verts(bm, obj = None):
     verts_to_remove = []
-    for v in bm.verts:
-        if len(v.link_edges) == 0:
-            verts_to_remove.append(v)
+    if obj is not None:
+        index = get_edit_mesh_adjacency_index(obj)
+        bm.verts.ensure_lookup_table()
+        for i in (index.valences() == 0).nonzero()[0]:
+            verts_to_remove.append(bm.verts[i])
+    else:
+        for v in bm.verts:
+            if len(v.link_edges) == 0:
+                verts_to_remove.append(v)
             
     for v in verts_to_remove:
         bm.verts.remove(v)
 
+# Remove loose verts and edges, zero-area faces and duplicate faces, and collapse 
+# zero-length edges, finding all of them at once from the mesh arrays of obj (see 
+# find_degenerate_geometry in Ch6/topology_arrays.py). Each element type goes in one 
+# bmesh.ops.delete, and the zero-length edges in one weld_verts; deleting them would 
+# delete their faces too. The faces take along the edges and verts no other face uses, 
+# so they don't stay behind as wire, while edges shared with neighbours are kept. An 
+# element can be on more than one list (the verts of a loose edge are loose verts too, 
+# and go with the edge), so whatever an earlier step already removed is skipped. Returns 
+# the number of elements of each kind found.
+def clean_up_mesh(bm, obj, distance = 1e-6, area = 1e-12):
+    index = get_edit_mesh_adjacency_index(obj)
+    coords = get_vert_coords(obj.data)
+    masks = find_degenerate_geometry(coords, index.edge_verts, index.loop_starts, \
+        index.loop_totals, index.loop_verts, index.loop_edges, distance, area)
+
+    bm.verts.ensure_lookup_table()
+    bm.edges.ensure_lookup_table()
+    bm.faces.ensure_lookup_table()
+    faces = [bm.faces[i] for i in \
+        np.flatnonzero(masks['zero_area_faces'] | masks['duplicate_faces'])]
+    edges = [bm.edges[i] for i in np.flatnonzero(masks['loose_edges'])]
+    verts = [bm.verts[i] for i in np.flatnonzero(masks['loose_verts'])]
+    sources, targets = collapse_edge_targets(len(coords), \
+        index.edge_verts[masks['zero_length_edges']])
+    target_map = {bm.verts[i]: bm.verts[j] for i, j in zip(sources, targets)}
+
+    # Delete contexts: 1 = VERTS, 2 = EDGES, 5 = FACES.
+    if faces:
+        bmesh.ops.delete(bm, geom = faces, context = 5)
+    edges = [e for e in edges if e.is_valid]
+    if edges:
+        bmesh.ops.delete(bm, geom = edges, context = 2)
+    verts = [v for v in verts if v.is_valid]
+    if verts:
+        bmesh.ops.delete(bm, geom = verts, context = 1)
+    target_map = {v: t for v, t in target_map.items() if v.is_valid and t.is_valid}
+    if target_map:
+        bmesh.ops.weld_verts(bm, targetmap = target_map)
+    return {name: int(mask.sum()) for name, mask in masks.items()}
+
 #=========== Test Removing Loose Verts ====================================
 def gen_mesh_with_loose_verts(location, name):
     obj, bm = create_cube_bmesh(bpy.context, name = name, location = location, debug = True, size = 4.0)
@@ -550,7 +1063,7 @@ def test_remove_loose_verts_before():
 
 def test_remove_loose_verts_after():    
     obj_after, bm_after = gen_mesh_with_loose_verts((0, -4, 0), 'test_remove_loose_verts_after')
-    remove_loose_verts(bm_after)
+    remove_loose_verts(bm_after, obj_after)
     bpy.context.tool_settings.mesh_select_mode = [True, False, False]
     bmesh.update_edit_mesh(obj_after.data)
     bpy.context.scene.update()
@@ -559,6 +1072,16 @@ def test_remove_loose_verts():
     test_remove_loose_verts_before()
     test_remove_loose_verts_after()
 
+def test_clean_up_mesh():
+    obj, bm = gen_mesh_with_loose_verts((8, 0, 0), 'test_clean_up_mesh')
+    bm.verts.ensure_lookup_table()
+    bm.edges.new((bm.verts[8], bm.verts[9]))
+    sliver = [bm.verts.new((x, 0, 4)) for x in range(3)]
+    bm.faces.new(sliver)
+    print(clean_up_mesh(bm, obj))
+    bmesh.update_edit_mesh(obj.data)
+    bpy.context.scene.update()
+
 #=========== Test Joining + Splitting Faces =============================================================
 def test_join_split_faces_before():
     obj, bm = create_grid_bmesh(bpy.context, name = 'test_join_faces_before', location = (7, 0, 0), debug = True, x_segments = 10, y_segments = 4, size = 6)
@@ -588,10 +1111,67 @@ def test_join_split_faces():
     test_join_split_faces_bmesh()
     
 #=========== Putting It Altogether ===========================================
+# Generated fire hydrant meshes keyed on their shape parameters, least recently
+# used first. Objects built from the same key share one mesh datablock.
+fire_hydrant_mesh_cache = OrderedDict()
+fire_hydrant_cache_size = 64
+
+# Canonical cache key for the parameters that shape the hydrant mesh. The bend
+# factors are only used when stylizing, so they are dropped otherwise. Location
+# and subsurf live on the object, not the mesh, and are left out.
+def fire_hydrant_cache_key(num_cir_segments, pole_diameter, num_pole_levels, \
+    num_dome_levels, stylize, pole_bent_factor, dome_bent_factor):
+    if stylize:
+        bent_factors = (float(pole_bent_factor), float(dome_bent_factor))
+    else:
+        bent_factors = None
+    return (int(num_cir_segments), float(pole_diameter), int(num_pole_levels), \
+        int(num_dome_levels), bool(stylize), bent_factors)
+
+# Look up a cached mesh, marking it as most recently used. Meshes removed from
+# bpy.data since they were cached are dropped.
+def get_cached_fire_hydrant_mesh(key):
+    mesh = fire_hydrant_mesh_cache.get(key)
+    if mesh is None:
+        return None
+    try:
+        mesh.name
+    except ReferenceError:
+        del fire_hydrant_mesh_cache[key]
+        return None
+    fire_hydrant_mesh_cache.move_to_end(key)
+    return mesh
+
+def cache_fire_hydrant_mesh(key, mesh):
+    fire_hydrant_mesh_cache[key] = mesh
+    fire_hydrant_mesh_cache.move_to_end(key)
+    while len(fire_hydrant_mesh_cache) > fire_hydrant_cache_size:
+        fire_hydrant_mesh_cache.popitem(last = False)
+
+def clear_fire_hydrant_cache():
+    fire_hydrant_mesh_cache.clear()
+
+def add_fire_hydrant_subsurf(fh_obj, subsurf_level):
+    fh_subsurf_mod = fh_obj.modifiers.new('subsurf_mod', 'SUBSURF')
+    fh_subsurf_mod.levels = subsurf_level
+
+# Create a new fire hydrant object. With use_cache, a hydrant whose shape
+# parameters were built before gets a new object linked to the cached mesh.
 def gen_stylized_fire_hydrant(context, debug = False, location = (0, 0, 0), \
     num_cir_segments = 16, pole_diameter = 2, num_pole_levels = 3, num_dome_levels = 5, \
     stylize = False, pole_bent_factor = 1, dome_bent_factor = 1, subsurf = False, \
-    subsurf_level = 2):
+    subsurf_level = 2, use_cache = True):
+    key = fire_hydrant_cache_key(num_cir_segments, pole_diameter, num_pole_levels, \
+        num_dome_levels, stylize, pole_bent_factor, dome_bent_factor)
+    mesh = get_cached_fire_hydrant_mesh(key) if use_cache and not debug else None
+    if mesh is not None:
+        fh_obj = bpy.data.objects.new(name = 'fire_hydrant', object_data = mesh)
+        fh_obj.location = location
+        context.scene.objects.link(fh_obj)
+        if subsurf:
+            add_fire_hydrant_subsurf(fh_obj, subsurf_level)
+        return fh_obj
+
     fh_obj, bm = create_canvas_obj(context, name = 'fire_hydrant', location = location, \
         debug = debug) 
     bmesh.ops.create_cone(bm, cap_ends = False, cap_tris = False, \
@@ -599,34 +1179,23 @@ def gen_stylized_fire_hydrant(context, debug = False, location = (0, 0, 0), \
         diameter2 = pole_diameter*1.33, depth = pole_diameter*0.5)
     bm.edges.ensure_lookup_table()
     if subsurf:
-        fh_subsurf_mod = fh_obj.modifiers.new('subsurf_mod', 'SUBSURF')
-        fh_subsurf_mod.levels = subsurf_level
+        add_fire_hydrant_subsurf(fh_obj, subsurf_level)
 
-    loop_cut_slide(context, bm.edges[1], num_cuts = 2, slide_distance = 0)
-    
-    bm.edges.ensure_lookup_table()
-    bm.edges[num_cir_segments*3 + 1].select = True
-    bpy.ops.mesh.loop_multi_select(ring = True)
-    context.tool_settings.mesh_select_mode = [False, False, True]
-
-    bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate = {"value": Vector((0, 0, 0))})
-    bpy.ops.transform.shrink_fatten(value = -0.1)
+    # Everything below is plain bmesh (no operators that need a viewport or the 
+    # selection), so this also runs in blender -b.
+    base_top_edge = bm.edges[2]
+    cut_loops = loop_cut_slide_bmesh(bm, bm.edges[1], num_cuts = 2, slide_distance = 0)
 
-    bpy.ops.mesh.bevel(offset = 0.1, segments = 2, loop_slide = False, vertex_only = False)
+    band_faces = set(f for e in cut_loops[0] for f in e.link_faces) & \
+        set(f for e in cut_loops[1] for f in e.link_faces)
+    band_faces = extrude_faces_shrink_fatten_bmesh(bm, list(band_faces), -0.1)
+    band_edges = set(e for f in band_faces for e in f.edges)
+    bevel_edges_bmesh(bm, element_indices(bm.edges, band_edges), offset = 0.1, \
+        segments = 2, loop_slide = False)
 
-    context.tool_settings.mesh_select_mode = [False, True, False]
-    bm.edges.ensure_lookup_table()
-    select_edge_loops(bm, [bm.edges[2]], select_rings = False)
+    base_top_edges, base_top_verts = walk_edge_loop(base_top_edge)
+    ref_edge = extrude_edges_shrink_fatten_bmesh(bm, base_top_edges, pole_diameter*0.33)[0]
 
-    bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate = {"value": Vector((0, 0, 0))})
-    bpy.ops.transform.shrink_fatten(value = pole_diameter*0.33)
-
-    bm.edges.ensure_lookup_table()
-    for e in bm.edges:
-        if e.select:
-            ref_edge = e
-            break
-    context.tool_settings.mesh_select_mode = [False, False, True]
     edge_loops_pole_cross_sections = []
     for i in range(num_pole_levels + 1):
         z_offset = pole_diameter if i < num_pole_levels else pole_diameter*0.5
@@ -638,26 +1207,14 @@ def gen_stylized_fire_hydrant(context, debug = False, location = (0, 0, 0), \
         else:
             direction = Vector((0, 0, z_offset))
             scale = Vector((1, 1, 1))
-        extrusion = extrude_edge_loop_copy_move(bm, ref_edge, direction, scale)
+        extrusion, bridged_faces = extrude_edge_loop_copy_move_bmesh(bm, ref_edge, direction, scale)
         edge_loops_pole_cross_sections.append(extrusion)
         ref_edge = extrusion[0]
 
         if i == 0:
-            bm.faces.ensure_lookup_table()
-            face_loop_pole_bottom = []
-            face_idx = 0
-            for f in bm.faces:
-                if f.select:
-                    if face_idx % 2 == 0:
-                        face_loop_pole_bottom.append(f)
-                    face_idx += 1
-    bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate = {"value": Vector((0, 0, 0))})
-    bpy.ops.transform.shrink_fatten(value = pole_diameter*-0.25)
-    bm.faces.ensure_lookup_table()
-    face_loop_pole_top = []
-    for f in bm.faces:
-        if f.select:
-            face_loop_pole_top.append(f)
+            face_loop_pole_bottom = bridged_faces[::2]
+    face_loop_pole_top = extrude_faces_shrink_fatten_bmesh(bm, bridged_faces, \
+        pole_diameter*-0.25)
 
     face_loops_dome = []
     face_loops_dome_cap = []
@@ -672,51 +1229,38 @@ def gen_stylized_fire_hydrant(context, debug = False, location = (0, 0, 0), \
             z_offset = pole_diameter*0.1
             direction = Vector((0, 0, z_offset))
             scale = Vector((1, 1, 1))
-        extrusion = extrude_edge_loop_copy_move(bm, ref_edge, direction, scale)
+        extrusion, bridged_faces = extrude_edge_loop_copy_move_bmesh(bm, ref_edge, direction, scale)
         edge_loops_pole_cross_sections.append(extrusion)
         ref_edge = extrusion[0]        
-        bm.faces.ensure_lookup_table()
         
         if i < num_dome_levels:
-            face_idx = 0
-            for f in bm.faces:
-                if f.select:
-                    if face_idx % 2 == 0:
-                        face_loops_dome.append(f)
-                    face_idx += 1
+            face_loops_dome.extend(bridged_faces[::2])
         else:
-            cur_loop = []
-            for f in bm.faces:
-                if f.select:
-                    cur_loop.append(f)
-            face_loops_dome_cap.append(cur_loop)
+            face_loops_dome_cap.append(bridged_faces)
 
-    bpy.ops.mesh.select_all(action = 'DESELECT')
-    for f in face_loops_dome_cap[1]:
-        f.select = True
-    bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate = {"value": Vector((0, 0, 0))})
-    bpy.ops.transform.shrink_fatten(value = pole_diameter*-0.1)
-    bpy.ops.mesh.select_all(action = 'DESELECT')
-    for f in face_loops_dome_cap[2]:
-        f.select = True
-    bpy.ops.mesh.extrude_region_move(TRANSFORM_OT_translate = {"value": Vector((0, 0, 0))})
-    bpy.ops.transform.shrink_fatten(value = pole_diameter*0.15)
-    bpy.ops.mesh.select_all(action = 'DESELECT')
-    select_edge_loops(bm, [ref_edge], select_rings = False)
-    bpy.ops.mesh.edge_collapse()
+    extrude_faces_shrink_fatten_bmesh(bm, face_loops_dome_cap[1], pole_diameter*-0.1)
+    extrude_faces_shrink_fatten_bmesh(bm, face_loops_dome_cap[2], pole_diameter*0.15)
+    collapse_edge_loop_bmesh(bm, ref_edge)
 
-    bmesh.ops.inset_region(bm, faces = face_loop_pole_top, thickness = 0.3, depth = 0.1)
-    bmesh.ops.inset_individual(bm, faces = face_loop_pole_bottom, thickness = 0.2, depth = -0.1)
-    bmesh.ops.inset_region(bm, faces = face_loops_dome, thickness = 0.1, depth = -0.15)
+    inset_faces_bmesh(bm, element_indices(bm.faces, face_loop_pole_top), thickness = 0.3, \
+        depth = 0.1)
+    inset_faces_bmesh(bm, element_indices(bm.faces, face_loop_pole_bottom), thickness = 0.2, \
+        depth = -0.1, individual = True)
+    inset_faces_bmesh(bm, element_indices(bm.faces, face_loops_dome), thickness = 0.1, \
+        depth = -0.15)
 
     bmesh.ops.recalc_face_normals(bm, faces = bm.faces)
     bmesh.update_edit_mesh(fh_obj.data)
     bpy.ops.object.mode_set(mode = 'OBJECT')
-    bpy.ops.object.select_all(action = 'SELECT')
-    bpy.ops.object.shade_smooth()
-    bpy.ops.object.select_all(action = 'DESELECT')
-    config_viewport_shading(context)
-    bpy.context.scene.update()
+    set_array(fh_obj.data.polygons, 'use_smooth', np.ones(len(fh_obj.data.polygons), dtype = bool))
+    # There is no window to configure when running in the background.
+    if context.window is not None:
+        config_viewport_shading(context)
+    context.scene.update()
+
+    if use_cache and not debug:
+        cache_fire_hydrant_mesh(key, fh_obj.data)
+    return fh_obj
 
 def config_viewport_shading(context):
     for a in context.window.screen.areas:
@@ -747,12 +1291,148 @@ def test_gen_fire_hydrant():
         pole_diameter = 1, num_pole_levels = 6, num_dome_levels = 5, \
         stylize = True, pole_bent_factor = 2, dome_bent_factor = 1.5)
 
+def test_gen_fire_hydrant_cached(num_rows = 20, num_cols = 20):
+    variants = [{}, {'stylize': True}, \
+        {'pole_diameter': 1, 'num_pole_levels': 6, 'num_dome_levels': 5}]
+    for i in range(num_rows):
+        for j in range(num_cols):
+            gen_stylized_fire_hydrant(bpy.context, location = (i*5, j*5, 0), \
+                **variants[(i + j) % len(variants)])
+
 def test_gen_fh_num_segments():
     gen_stylized_fire_hydrant(bpy.context, location = (12, 0, 0), num_cir_segments = 8)
     gen_stylized_fire_hydrant(bpy.context, location = (5, 0, 0), num_cir_segments = 16)
     gen_stylized_fire_hydrant(bpy.context, location = (-2, 0, 0), num_cir_segments = 25)
     gen_stylized_fire_hydrant(bpy.context, location = (-9, 0, 0), num_cir_segments = 64)
 
+#=========== Building From Arrays ============================================
+# The generators above replayed on NumPy buffers with Ch5.mesh_builder. No operators 
+# and no Edit mode, so these also run in blender -b; the mesh is written once.
+def create_obj_from_builder(context, builder, name, location = (0, 0, 0)):
+    coords, loop_verts, loop_totals, edge_verts = builder.build()
+    mesh = bpy.data.meshes.new(name = name + '_mesh')
+    fill_mesh(mesh, coords, loop_verts, loop_totals, edge_verts)
+    obj = bpy.data.objects.new(name = name, object_data = mesh)
+    obj.location = location
+    context.scene.objects.link(obj)
+    return obj
+
+def create_loop_stack_arrays(context, name = 'loop_stack', location = (0, 0, 0), \
+    diameter = 2, num_loops = 2, loop_segments = 16, level_height = 1, bridge = False):
+    loop_obj, bm = create_loop_stack(context, name, location, False, diameter, num_loops, \
+        loop_segments, level_height, bridge, edit_mode = False)
+    return loop_obj
+
+def create_cylinder_by_extrusion_arrays(context, name = 'cylinder_extruded', \
+    location = (0, 0, 0), diameter = 2, segments = 8, num_levels = 2, level_height = 2):
+    builder = cylinder_by_extrusion_recipe(diameter, segments, num_levels, level_height)
+    return create_obj_from_builder(context, builder, name, location)
+
+def gen_stylized_fire_hydrant_arrays(context, location = (0, 0, 0), \
+    num_cir_segments = 16, pole_diameter = 2, num_pole_levels = 3, num_dome_levels = 5, \
+    stylize = False, pole_bent_factor = 1, dome_bent_factor = 1, subsurf = False, \
+    subsurf_level = 2):
+    builder = fire_hydrant_recipe(num_cir_segments, pole_diameter, num_pole_levels, \
+        num_dome_levels, stylize, pole_bent_factor, dome_bent_factor)
+    fh_obj = create_obj_from_builder(context, builder, 'fire_hydrant', location)
+    set_array(fh_obj.data.polygons, 'use_smooth', np.ones(len(fh_obj.data.polygons), dtype = bool))
+    if subsurf:
+        add_fire_hydrant_subsurf(fh_obj, subsurf_level)
+    return fh_obj
+
+#=========== Batch Generation ================================================
+# Parameters of gen_stylized_fire_hydrant_arrays that belong to the object, not the mesh.
+fire_hydrant_obj_params = ('location', 'subsurf', 'subsurf_level')
+
+def split_fire_hydrant_params(params):
+    shape = dict(fire_hydrant_shape_defaults)
+    obj_params = {}
+    for name, value in params.items():
+        if name in fire_hydrant_shape_defaults:
+            shape[name] = value
+        elif name in fire_hydrant_obj_params:
+            obj_params[name] = value
+        else:
+            raise TypeError("unexpected fire hydrant parameter '%s'" % name)
+    return shape, obj_params
+
+# Generate one fire hydrant per parameter dict (the keyword arguments of 
+# gen_stylized_fire_hydrant_arrays). The meshes are built as arrays in a pool of 
+# processes (defaults to one per CPU), once per distinct shape, then written and linked 
+# to the scene in one pass; hydrants with the same shape share a mesh. Pass 
+# processes = 1 to build everything in Blender's own process instead.
+# Returns the new objects in the order of param_dicts.
+def gen_fire_hydrant_batch(context, param_dicts, processes = None, chunksize = None):
+    keys = []
+    shapes = {}
+    obj_params = []
+    for params in param_dicts:
+        shape, obj_param = split_fire_hydrant_params(params)
+        key = fire_hydrant_cache_key(**shape)
+        if key not in shapes:
+            shapes[key] = shape
+        keys.append(key)
+        obj_params.append(obj_param)
+    unique_keys = list(shapes)
+    jobs = [shapes[key] for key in unique_keys]
+
+    if processes == 1 or len(jobs) < 2:
+        results = [build_fire_hydrant_arrays(job) for job in jobs]
+    else:
+        # See audit_scene in Ch6/mesh_audit.py.
+        multiprocessing.set_executable(bpy.app.binary_path_python)
+        if chunksize is None:
+            chunksize = max(1, len(jobs)//(4*(processes or multiprocessing.cpu_count())))
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(build_fire_hydrant_arrays, jobs, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    meshes = {}
+    for key, (coords, loop_verts, loop_totals, edge_verts) in zip(unique_keys, results):
+        mesh = bpy.data.meshes.new(name = 'fire_hydrant_mesh')
+        fill_mesh(mesh, coords, loop_verts, loop_totals, edge_verts)
+        set_array(mesh.polygons, 'use_smooth', np.ones(len(loop_totals), dtype = bool))
+        meshes[key] = mesh
+
+    objs = []
+    for key, obj_param in zip(keys, obj_params):
+        obj = bpy.data.objects.new(name = 'fire_hydrant', object_data = meshes[key])
+        obj.location = obj_param.get('location', (0, 0, 0))
+        context.scene.objects.link(obj)
+        if obj_param.get('subsurf', False):
+            add_fire_hydrant_subsurf(obj, obj_param.get('subsurf_level', 2))
+        objs.append(obj)
+    context.scene.update()
+    return objs
+
+#=========== Test Building From Arrays =======================================
+def test_create_from_arrays():
+    create_loop_stack_arrays(bpy.context, location = (-6, 6, 0), num_loops = 3)
+    create_cylinder_by_extrusion_arrays(bpy.context, location = (0, 6, 0), num_levels = 3)
+    bpy.context.scene.update()
+
+def test_gen_fire_hydrant_arrays():
+    gen_stylized_fire_hydrant_arrays(bpy.context, location = (15, -12, 0))
+    gen_stylized_fire_hydrant_arrays(bpy.context, location = (5, -12, 0), subsurf = True)
+    gen_stylized_fire_hydrant_arrays(bpy.context, location = (-5, -12, 0), \
+        pole_diameter = 2, num_pole_levels = 2, num_dome_levels = 3)
+    gen_stylized_fire_hydrant_arrays(bpy.context, location = (-13, 0, 0), \
+        pole_diameter = 1, num_pole_levels = 6, num_dome_levels = 5, \
+        stylize = True, pole_bent_factor = 2, dome_bent_factor = 1.5)
+    bpy.context.scene.update()
+
+def test_gen_fire_hydrant_batch(num_rows = 40, num_cols = 40):
+    param_dicts = []
+    for i in range(num_rows):
+        for j in range(num_cols):
+            param_dicts.append({'location': (i*6, j*6, 0), \
+                'num_pole_levels': 2 + i % 4, 'num_dome_levels': 3 + j % 3, \
+                'stylize': (i + j) % 2 == 1, 'pole_bent_factor': 1 + (i % 3)*0.5})
+    gen_fire_hydrant_batch(bpy.context, param_dicts)
+
 #========= Sample Usage ======================================================
 #test_create_cylinder_bmesh()
 #test_create_cone_bmesh()
@@ -762,6 +1442,7 @@ def test_gen_fh_num_segments():
 #test_select_edge_loops()
      
 #test_create_loop_stack()
+#test_create_loop_stack_bridged()
 #test_bridge_loops()
 
 #test_extrude()
@@ -771,13 +1452,24 @@ def test_gen_fh_num_segments():
 #test_merge_verts()
 #test_merge_vert_loops()
 #test_merge_vert_loops_reverse()
+#test_merge_vert_loops_nearest()
+#test_merge_by_distance()
 #test_rip_verts()
+#test_rip_corners_bmesh()
 #test_join_split_faces()
 
 #test_bevel_bpy()
+#test_bevel_edges_bmesh()
 #test_inset()
+#test_inset_faces_bmesh()
 
 #test_remove_loose_verts()
+#test_clean_up_mesh()
 
 test_gen_fire_hydrant()
-#test_gen_fh_num_segments()
\ No newline at end of file
+#test_gen_fire_hydrant_cached()
+#test_gen_fh_num_segments()
+
+#test_create_from_arrays()
+#test_gen_fire_hydrant_arrays()
+#test_gen_fire_hydrant_batch()
\ No newline at end of file
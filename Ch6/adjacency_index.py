@@ -0,0 +1,136 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "AdjacencyIndex",
+    "topology_fingerprint",
+    "get_adjacency_index",
+    "get_edit_mesh_adjacency_index",
+    "clear_adjacency_cache",
+    )
+
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from Ch6.mesh_arrays import *
+from Ch6.topology_arrays import *
+
+# Cheap key for the topology of a mesh: element counts plus checksums of the edge array 
+# and of the face arrays (sizes, loop starts and the vert of every loop). Moving verts 
+# around leaves it unchanged; adding, removing or reconnecting edges or faces, or 
+# reordering faces (e.g. sort_elements, even between faces of the same size), doesn't.
+def topology_fingerprint(num_verts, edge_verts, loop_starts, loop_totals, loop_verts):
+    arrays = [np.ascontiguousarray(arr, dtype = np.int32) for arr in \
+        (edge_verts, loop_starts, loop_totals, loop_verts)]
+    return (num_verts, len(edge_verts), len(loop_totals), len(loop_verts)) + \
+        tuple(zlib.crc32(arr.tobytes()) for arr in arrays)
+
+# Compressed sparse row adjacency of a mesh, built once from its flat arrays. For each 
+# relation, the neighbours of element i are xs[x_offsets[i]:x_offsets[i + 1]], e.g. the 
+# edges of vert v are vert_edges[vert_edge_offsets[v]:vert_edge_offsets[v + 1]].
+class AdjacencyIndex:
+    def __init__(self, num_verts, edge_verts, loop_starts, loop_totals, loop_verts, loop_edges):
+        self.num_verts = num_verts
+        self.num_edges = len(edge_verts)
+        self.num_faces = len(loop_totals)
+        self.edge_verts = edge_verts
+        self.loop_starts = loop_starts
+        self.loop_totals = loop_totals
+        self.loop_verts = loop_verts
+        self.loop_edges = loop_edges
+        self.fingerprint = topology_fingerprint(num_verts, edge_verts, loop_starts, \
+            loop_totals, loop_verts)
+
+        edge_ids = np.arange(self.num_edges, dtype = np.int32)
+        self.vert_edge_offsets, self.vert_edges = csr_from_pairs(edge_verts.ravel(), \
+            np.repeat(edge_ids, 2), num_verts)
+        self.loop_faces = loop_faces(loop_starts, loop_totals)
+        self.vert_face_offsets, self.vert_faces = csr_from_pairs(loop_verts, \
+            self.loop_faces, num_verts)
+        self.edge_face_offsets, self.edge_faces = csr_from_pairs(loop_edges, \
+            self.loop_faces, self.num_edges)
+        self.face_loop_offsets = np.zeros(self.num_faces + 1, dtype = np.int64)
+        np.cumsum(loop_totals, out = self.face_loop_offsets[1:])
+        self.face_loops = face_loop_indices(loop_starts, loop_totals)[0]
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        return cls(len(mesh.vertices), get_edge_verts(mesh), get_face_loop_starts(mesh), \
+            get_face_loop_totals(mesh), get_loop_verts(mesh), get_loop_edges(mesh))
+
+    def valences(self):
+        return np.diff(self.vert_edge_offsets)
+
+    def edge_face_counts(self):
+        return np.diff(self.edge_face_offsets)
+
+    def edges_of_vert(self, v):
+        return self.vert_edges[self.vert_edge_offsets[v]:self.vert_edge_offsets[v + 1]]
+
+    def faces_of_vert(self, v):
+        return self.vert_faces[self.vert_face_offsets[v]:self.vert_face_offsets[v + 1]]
+
+    def faces_of_edge(self, e):
+        return self.edge_faces[self.edge_face_offsets[e]:self.edge_face_offsets[e + 1]]
+
+    def loops_of_face(self, f):
+        return self.face_loops[self.face_loop_offsets[f]:self.face_loop_offsets[f + 1]]
+
+# Adjacency indices by mesh datablock, each tagged with the fingerprint it was built 
+# from, least recently used first. Each one holds the full CSR arrays of its mesh, so 
+# only the last adjacency_cache_size meshes are kept; the entries of meshes that were 
+# deleted age out like any other.
+adjacency_cache = OrderedDict()
+adjacency_cache_size = 8
+
+def cache_adjacency_index(key, index):
+    adjacency_cache[key] = index
+    adjacency_cache.move_to_end(key)
+    while len(adjacency_cache) > adjacency_cache_size:
+        adjacency_cache.popitem(last = False)
+
+# Return the adjacency index of the mesh, rebuilding it only if the topology has changed 
+# since the last call. The edge and face arrays are read to check that. The mesh must be 
+# in Object mode, or call obj.update_from_editmode() first.
+def get_adjacency_index(mesh):
+    key = mesh.as_pointer()
+    edge_verts = get_edge_verts(mesh)
+    loop_starts = get_face_loop_starts(mesh)
+    loop_totals = get_face_loop_totals(mesh)
+    loop_verts = get_loop_verts(mesh)
+    fingerprint = topology_fingerprint(len(mesh.vertices), edge_verts, loop_starts, \
+        loop_totals, loop_verts)
+    index = adjacency_cache.get(key)
+    if index is None or index.fingerprint != fingerprint:
+        index = AdjacencyIndex(len(mesh.vertices), edge_verts, loop_starts, loop_totals, \
+            loop_verts, get_loop_edges(mesh))
+        cache_adjacency_index(key, index)
+    else:
+        adjacency_cache.move_to_end(key)
+    return index
+
+# Same as get_adjacency_index for an object that is in Edit mode. The edit mesh is written 
+# back to the mesh data first, so the element indices match those of its bmesh.
+def get_edit_mesh_adjacency_index(obj):
+    obj.update_from_editmode()
+    return get_adjacency_index(obj.data)
+
+def clear_adjacency_cache():
+    adjacency_cache.clear()
@@ -0,0 +1,305 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Benchmarks for the Ch6/mesh_connectivity.py selectors on synthetic meshes. Runs without 
+# a display, e.g.
+#
+#   blender -b --factory-startup --python Ch6/benchmark_mesh_connectivity.py -- \
+#       --sizes 10000 100000 1000000 --output bench.json --baseline bench_prev.json
+#
+# Each selector is timed in every implementation it has ('bmesh' for the original BMesh 
+# walks, 'arrays' for the NumPy path, 'streaming' for the chunked one) on a quad grid, 
+# a torus, a triangulated grid and an ngon-heavy grid of roughly each requested face 
+# count. Wall time (best of --repeats) and peak memory go to the --output JSON. With 
+# --baseline, any timing more than --threshold (a fraction, e.g. 0.2 = 20%) slower than 
+# the matching baseline entry, or any peak memory figure that grew by more than that 
+# fraction, is reported and Blender exits with status 1.
+
+__all__ = (
+    "make_grid_arrays",
+    "make_torus_arrays",
+    "make_tri_grid_arrays",
+    "make_ngon_grid_arrays",
+    "run_benchmarks",
+    "find_regressions",
+    )
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import bpy
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Ch6.adjacency_index import *
+from Ch6.mesh_arrays import *
+from Ch6.mesh_connectivity import *
+
+# ========== Synthetic Meshes ====================================================
+# Each returns (coords, loop_verts, loop_totals) ready for fill_mesh.
+
+# nx by ny quads on the XY plane, with a bit of noise in Z so that not every dihedral 
+# angle is 0.
+def make_grid_arrays(nx, ny):
+    x, y = np.meshgrid(np.arange(nx + 1), np.arange(ny + 1))
+    z = np.sin(x*0.7)*np.cos(y*0.3)*0.5
+    coords = np.column_stack((x.ravel(), y.ravel(), z.ravel())).astype(np.float32)
+    cx, cy = np.meshgrid(np.arange(nx), np.arange(ny))
+    v0 = (cy*(nx + 1) + cx).ravel()
+    quads = np.column_stack((v0, v0 + 1, v0 + nx + 2, v0 + nx + 1))
+    return coords, quads.ravel(), np.full(len(quads), 4, dtype = np.int32)
+
+# Closed torus of nu by nv quads (every vert has valence 4, so no poles).
+def make_torus_arrays(nu, nv, major_radius = 4.0, minor_radius = 1.0):
+    u = np.arange(nu)*(2*math.pi/nu)
+    v = np.arange(nv)*(2*math.pi/nv)
+    uu, vv = np.meshgrid(u, v)
+    r = major_radius + minor_radius*np.cos(vv)
+    coords = np.column_stack(((r*np.cos(uu)).ravel(), (r*np.sin(uu)).ravel(), \
+        (minor_radius*np.sin(vv)).ravel())).astype(np.float32)
+    iu, iv = np.meshgrid(np.arange(nu), np.arange(nv))
+    iu1 = (iu + 1) % nu
+    iv1 = (iv + 1) % nv
+    quads = np.column_stack(((iv*nu + iu).ravel(), (iv*nu + iu1).ravel(), \
+        (iv1*nu + iu1).ravel(), (iv1*nu + iu).ravel()))
+    return coords, quads.ravel(), np.full(len(quads), 4, dtype = np.int32)
+
+# Grid with every quad split into two triangles.
+def make_tri_grid_arrays(nx, ny):
+    coords, quad_verts, _ = make_grid_arrays(nx, ny)
+    quads = quad_verts.reshape(-1, 4)
+    tris = np.column_stack((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]])).reshape(-1, 3)
+    return coords, tris.ravel(), np.full(len(tris), 3, dtype = np.int32)
+
+# Grid with pairs of neighbouring quads merged into hexagons (nx must be even).
+def make_ngon_grid_arrays(nx, ny):
+    coords, quad_verts, _ = make_grid_arrays(nx, ny)
+    quads = quad_verts.reshape(ny, nx, 4)
+    left = quads[:, 0::2].reshape(-1, 4)
+    right = quads[:, 1::2].reshape(-1, 4)
+    hexes = np.column_stack((left[:, 0], right[:, 0], right[:, 1], right[:, 2], \
+        right[:, 3], left[:, 3]))
+    return coords, hexes.ravel(), np.full(len(hexes), 6, dtype = np.int32)
+
+def square_side(num_faces):
+    side = max(2, int(math.sqrt(num_faces)))
+    return side + side % 2
+
+mesh_generators = {
+    'grid': lambda n: make_grid_arrays(square_side(n), square_side(n)),
+    'torus': lambda n: make_torus_arrays(square_side(n), square_side(n)),
+    'tri_grid': lambda n: make_tri_grid_arrays(square_side(n/2), square_side(n/2)),
+    'ngon_grid': lambda n: make_ngon_grid_arrays(square_side(n*2), square_side(n*2)),
+    }
+
+# ========== Selectors Under Test ================================================
+# selector name -> {implementation: function(context, obj)}
+def make_selector_table(chunk_size):
+    def on_active(func):
+        def run(context, obj):
+            context.scene.objects.active = obj
+            func(context)
+        return run
+
+    return {
+        'select_poles': {
+            'bmesh': on_active(select_poles_bmesh),
+            'arrays': lambda context, obj: select_poles(context, obj = obj, enter_edit_mode = False),
+            'streaming': lambda context, obj: select_poles(context, chunk_size, obj = obj, \
+                enter_edit_mode = False),
+            },
+        'select_face_corners_less_than_angle': {
+            'bmesh': on_active(lambda context: \
+                select_face_corners_less_than_angle_bmesh(context, 60)),
+            'arrays': lambda context, obj: select_face_corners_less_than_angle(context, 60, \
+                obj = obj, enter_edit_mode = False),
+            },
+        'auto_mark_sharp': {
+            'bmesh': on_active(lambda context: auto_mark_sharp_bmesh(context, 30)),
+            'arrays': lambda context, obj: auto_mark_sharp(context, 30, obj = obj),
+            },
+        'select_ngons': {
+            'bmesh': on_active(select_ngons_bmesh),
+            'arrays': lambda context, obj: select_ngons(context, obj = obj, enter_edit_mode = False),
+            'streaming': lambda context, obj: select_ngons(context, chunk_size, obj = obj, \
+                enter_edit_mode = False),
+            },
+        'select_non_quads': {
+            'bmesh': on_active(select_non_quads_bmesh),
+            'arrays': lambda context, obj: select_non_quads(context, obj = obj, \
+                enter_edit_mode = False),
+            'streaming': lambda context, obj: select_non_quads(context, chunk_size, obj = obj, \
+                enter_edit_mode = False),
+            },
+        }
+
+# ========== Measuring ===========================================================
+# Peak resident memory can be reset per measurement on Linux through clear_refs; 
+# elsewhere only allocations traced by tracemalloc (Python objects and NumPy arrays) are 
+# counted.
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+def read_peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024.0
+    except (IOError, OSError):
+        pass
+    return None
+
+def measure(func, context, obj, repeats):
+    best = None
+    for i in range(repeats):
+        if obj.mode != 'OBJECT':
+            context.scene.objects.active = obj
+            bpy.ops.object.mode_set(mode = 'OBJECT')
+        clear_adjacency_cache()
+        rss_tracked = reset_peak_rss()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(context, obj)
+        elapsed = time.perf_counter() - start
+        py_peak = tracemalloc.get_traced_memory()[1]/(1024.0*1024.0)
+        tracemalloc.stop()
+        rss_peak = read_peak_rss_mb() if rss_tracked else None
+        if best is None or elapsed < best['seconds']:
+            best = {'seconds': elapsed, 'peak_traced_mb': py_peak, 'peak_rss_mb': rss_peak}
+    return best
+
+def create_benchmark_obj(context, name, arrays):
+    mesh = fill_mesh(bpy.data.meshes.new(name + '_mesh'), *arrays)
+    obj = bpy.data.objects.new(name, mesh)
+    context.scene.objects.link(obj)
+    return obj
+
+def remove_benchmark_obj(context, obj):
+    if obj.mode != 'OBJECT':
+        context.scene.objects.active = obj
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+    mesh = obj.data
+    context.scene.objects.unlink(obj)
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(mesh)
+
+# Run every selector/implementation on every mesh kind and size. The original BMesh 
+# implementations are skipped on meshes with more than legacy_max_faces faces, since 
+# they would dominate the run time.
+def run_benchmarks(context, sizes, kinds = None, repeats = 3, legacy_max_faces = 200000, \
+    chunk_size = 1 << 20):
+    selectors = make_selector_table(chunk_size)
+    results = []
+    for kind in (kinds or sorted(mesh_generators)):
+        for size in sizes:
+            obj = create_benchmark_obj(context, 'bench_{}_{}'.format(kind, size), \
+                mesh_generators[kind](size))
+            num_faces = len(obj.data.polygons)
+            for selector in sorted(selectors):
+                for impl, func in sorted(selectors[selector].items()):
+                    if impl == 'bmesh' and num_faces > legacy_max_faces:
+                        continue
+                    result = measure(func, context, obj, repeats)
+                    result.update({'mesh': kind, 'size': size, 'faces': num_faces, \
+                        'selector': selector, 'impl': impl})
+                    print('{mesh:>9} {faces:>9} {selector:>36} {impl:>9}: {seconds:.4f} s'.format( \
+                        **result))
+                    results.append(result)
+            remove_benchmark_obj(context, obj)
+    return results
+
+def result_key(result):
+    return (result['mesh'], result['size'], result['selector'], result['impl'])
+
+# Metrics compared against the baseline, with the unit they are printed in.
+regression_metrics = (
+    ('seconds', 's'),
+    ('peak_traced_mb', 'MB'),
+    ('peak_rss_mb', 'MB'),
+    )
+
+# (result, baseline entry, metric) for every metric that grew by more than threshold 
+# (fraction) over the baseline. Memory figures missing on either side (no /proc) are 
+# skipped, and memory has to grow by at least min_mb as well, so that allocations of a 
+# few KB don't trip the threshold.
+def find_regressions(results, baseline, threshold, min_mb = 1.0):
+    baseline_by_key = {result_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = baseline_by_key.get(result_key(r))
+        if b is None:
+            continue
+        for metric, unit in regression_metrics:
+            new, old = r.get(metric), b.get(metric)
+            if new is None or old is None:
+                continue
+            if unit == 'MB' and new - old < min_mb:
+                continue
+            if new > old*(1 + threshold):
+                regressions.append((r, b, metric))
+    return regressions
+
+def parse_args(argv):
+    # Blender passes its own arguments through; ours come after '--'.
+    argv = argv[argv.index('--') + 1:] if '--' in argv else []
+    parser = argparse.ArgumentParser(description = 'Benchmark the mesh_connectivity selectors.')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [10000, 100000, 1000000], \
+        help = 'approximate face counts (10M faces needs several GB of RAM)')
+    parser.add_argument('--kinds', nargs = '+', choices = sorted(mesh_generators))
+    parser.add_argument('--repeats', type = int, default = 3)
+    parser.add_argument('--legacy-max-faces', type = int, default = 200000)
+    parser.add_argument('--chunk-size', type = int, default = 1 << 20)
+    parser.add_argument('--output', default = 'mesh_connectivity_bench.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type = float, default = 0.2)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv)
+    results = run_benchmarks(bpy.context, args.sizes, args.kinds, args.repeats, \
+        args.legacy_max_faces, args.chunk_size)
+    with open(args.output, 'w') as f:
+        json.dump({'blender': bpy.app.version_string, 'results': results}, f, indent = 2)
+    print('Wrote {} results to {}'.format(len(results), args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = find_regressions(results, baseline, args.threshold)
+        units = dict(regression_metrics)
+        for r, b, metric in regressions:
+            print('REGRESSION {mesh} {size} {selector} {impl}: '.format(**r) + \
+                '{} {:.4f} {unit} vs {:.4f} {unit}'.format(metric, r[metric], b[metric], \
+                unit = units[metric]))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "ConnectivityTracker",
+    "get_connectivity_tracker",
+    "update_selection_incremental",
+    "register_dirty_tracking",
+    "unregister_dirty_tracking",
+    "refresh_dirty_selections",
+    )
+
+# Incremental versions of select_poles, select_ngons and select_non_quads for interactive 
+# sessions (e.g. retopo with the Sculpt & Retopo Toolkit). The result of the last run is 
+# kept per mesh; on the next run only the elements touched by edges or faces that changed 
+# since then are re-tested, and only the elements whose result flipped get their select 
+# flag patched. Deleting elements shifts the indices after them, which shows up as a 
+# large dirty set; past full_rebuild_ratio of the mesh the selection is rebuilt instead.
+
+import bpy
+import bmesh
+import numpy as np
+
+from Ch6.adjacency_index import *
+from Ch6.mesh_arrays import *
+from Ch6.topology_arrays import *
+
+face_tests = {
+    'NGONS': ngon_mask,
+    'NON_QUADS': non_quad_mask,
+    }
+
+# Keeps the previous result of one analysis ('POLES', 'NGONS' or 'NON_QUADS') of a mesh.
+class ConnectivityTracker:
+    def __init__(self, analysis):
+        self.analysis = analysis
+        self.edge_verts = None
+        self.loop_totals = None
+        self.valences = None
+        self.mask = None
+
+    # Re-analyze the mesh. Returns the indices of the elements (verts for 'POLES', faces 
+    # otherwise) whose result changed, or None if there was no previous result.
+    def refresh(self, mesh):
+        if self.analysis == 'POLES':
+            return self.refresh_poles(mesh)
+        return self.refresh_faces(mesh)
+
+    def refresh_poles(self, mesh):
+        num_verts = len(mesh.vertices)
+        edge_verts = get_edge_verts(mesh)
+        if self.mask is None:
+            self.valences = vert_valences(num_verts, edge_verts)
+            self.mask = pole_mask(self.valences)
+            self.edge_verts = edge_verts
+            return None
+
+        removed, added = diff_edge_verts(self.edge_verts, edge_verts)
+        num_tracked = max(num_verts, len(self.valences))
+        valences = resized(self.valences, num_tracked)
+        np.subtract.at(valences, removed.ravel(), 1)
+        np.add.at(valences, added.ravel(), 1)
+        dirty = np.unique(np.concatenate((removed.ravel(), added.ravel(), \
+            np.arange(len(self.valences), num_verts))))
+        dirty = dirty[dirty < num_verts]
+
+        self.valences = valences[:num_verts]
+        self.mask = resized(self.mask, num_verts)
+        self.edge_verts = edge_verts
+        new_flags = pole_mask(self.valences[dirty])
+        changed = dirty[new_flags != self.mask[dirty]]
+        self.mask[changed] = ~self.mask[changed]
+        return changed
+
+    def refresh_faces(self, mesh):
+        loop_totals = get_face_loop_totals(mesh)
+        test = face_tests[self.analysis]
+        if self.mask is None:
+            self.mask = test(loop_totals)
+            self.loop_totals = loop_totals
+            return None
+
+        dirty = diff_loop_totals(self.loop_totals, loop_totals)
+        self.mask = resized(self.mask, len(loop_totals))
+        self.loop_totals = loop_totals
+        new_flags = test(loop_totals[dirty])
+        changed = dirty[new_flags != self.mask[dirty]]
+        self.mask[changed] = ~self.mask[changed]
+        return changed
+
+# Trackers by (mesh datablock, analysis).
+trackers = {}
+
+def get_connectivity_tracker(mesh, analysis):
+    key = (mesh.as_pointer(), analysis)
+    if key not in trackers:
+        trackers[key] = ConnectivityTracker(analysis)
+    return trackers[key]
+
+def patch_bmesh_selection(bm, analysis, changed, mask):
+    elements = bm.verts if analysis == 'POLES' else bm.faces
+    elements.ensure_lookup_table()
+    # Setting .select through bmesh also flushes it to the face's edges and verts (and 
+    # only deselects those that no other selected face still uses).
+    for i in changed:
+        elements[i].select = bool(mask[i])
+
+def patch_mesh_selection(mesh, analysis, changed, mask):
+    if analysis == 'POLES':
+        for i in changed:
+            mesh.vertices[i].select = bool(mask[i])
+        return
+    # Same flushing as the bmesh path: the verts and edges of a deselected face are only 
+    # deselected if no other selected face (the selection is the mask) still uses them. 
+    # Deselect first, so the selected faces' verts and edges win where they overlap.
+    index = get_adjacency_index(mesh)
+    for i in changed:
+        mesh.polygons[i].select = bool(mask[i])
+    for i in changed:
+        if mask[i]:
+            continue
+        loops = index.loops_of_face(i)
+        for v in index.loop_verts[loops]:
+            if not mask[index.faces_of_vert(v)].any():
+                mesh.vertices[v].select = False
+        for e in index.loop_edges[loops]:
+            if not mask[index.faces_of_edge(e)].any():
+                mesh.edges[e].select = False
+    for i in changed:
+        if mask[i]:
+            for l in index.loops_of_face(i):
+                mesh.vertices[index.loop_verts[l]].select = True
+                mesh.edges[index.loop_edges[l]].select = True
+
+# Bring the selection of obj up to date with the given analysis, re-testing only what 
+# changed since the last call. Works in Object mode and in Edit mode; in Edit mode the 
+# patch is applied to the edit bmesh so the object never leaves Edit mode (except for 
+# the very first, full, run).
+def update_selection_incremental(context, obj, analysis = 'POLES', full_rebuild_ratio = 0.25):
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+    mesh = obj.data
+    tracker = get_connectivity_tracker(mesh, analysis)
+    changed = tracker.refresh(mesh)
+    num_elements = len(tracker.mask)
+
+    if changed is None or len(changed) > full_rebuild_ratio*num_elements:
+        mode_to_restore = obj.mode
+        if mode_to_restore == 'EDIT':
+            bpy.ops.object.mode_set(mode = 'OBJECT')
+        if analysis == 'POLES':
+            set_selection(mesh, vert_mask = tracker.mask)
+        else:
+            set_selection(mesh, face_mask = tracker.mask)
+        if mode_to_restore == 'EDIT':
+            bpy.ops.object.mode_set(mode = 'EDIT')
+    elif len(changed) > 0:
+        if obj.mode == 'EDIT':
+            bm = bmesh.from_edit_mesh(mesh)
+            patch_bmesh_selection(bm, analysis, changed, tracker.mask)
+            bmesh.update_edit_mesh(mesh, tessface = False, destructive = False)
+        else:
+            patch_mesh_selection(mesh, analysis, changed, tracker.mask)
+    return changed
+
+# ========== Dirty Tracking ======================================================
+# Names of the objects whose mesh data changed since the last refresh_dirty_selections.
+dirty_objects = set()
+
+def track_dirty_objects(scene):
+    for obj in scene.objects:
+        if obj.type == 'MESH' and obj.is_updated_data:
+            dirty_objects.add(obj.name)
+
+# Record which mesh objects get edited, so refresh_dirty_selections only has to look at 
+# those. The handler only takes note of the names; patching the selection from inside 
+# the handler would trigger another scene update.
+def register_dirty_tracking():
+    if track_dirty_objects not in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.append(track_dirty_objects)
+
+def unregister_dirty_tracking():
+    if track_dirty_objects in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.remove(track_dirty_objects)
+    dirty_objects.clear()
+
+# Re-run the given analysis on every object edited since the last call.
+def refresh_dirty_selections(context, analysis = 'POLES'):
+    for name in list(dirty_objects):
+        obj = context.scene.objects.get(name)
+        if obj is not None and obj.type == 'MESH':
+            update_selection_incremental(context, obj, analysis)
+    dirty_objects.clear()
+
+# Sample usage----------------------------------------------------
+#register_dirty_tracking()
+#update_selection_incremental(bpy.context, bpy.context.scene.objects.active, 'POLES')
+# ... edit the mesh ...
+#refresh_dirty_selections(bpy.context, 'POLES')
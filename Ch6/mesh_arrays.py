@@ -0,0 +1,143 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "get_array",
+    "get_vert_coords",
+    "get_edge_verts",
+    "get_loop_verts",
+    "get_loop_edges",
+    "get_face_loop_starts",
+    "get_face_loop_totals",
+    "get_face_normals",
+    "set_array",
+    "fill_mesh",
+    "set_selection",
+    "mark_edges",
+    )
+
+# Bulk read/write of mesh data through foreach_get/foreach_set. Every call moves a whole 
+# attribute between the mesh and a NumPy array in one go instead of looping over 
+# BMVert/BMEdge/BMFace in Python. The mesh must be in Object mode (or updated with 
+# obj.update_from_editmode()) for these arrays to reflect the latest edits.
+
+import numpy as np
+
+from Ch6.topology_arrays import *
+
+def get_array(collection, attr, dtype, width = 1):
+    arr = np.empty(len(collection)*width, dtype = dtype)
+    collection.foreach_get(attr, arr)
+    return arr.reshape(-1, width) if width > 1 else arr
+
+def get_face_normals(mesh):
+    return get_array(mesh.polygons, 'normal', np.float32, 3)
+
+def set_array(collection, attr, arr):
+    collection.foreach_set(attr, np.ascontiguousarray(arr).ravel())
+
+def get_vert_coords(mesh):
+    return get_array(mesh.vertices, 'co', np.float32, 3)
+
+def get_edge_verts(mesh):
+    return get_array(mesh.edges, 'vertices', np.int32, 2)
+
+def get_loop_verts(mesh):
+    return get_array(mesh.loops, 'vertex_index', np.int32)
+
+def get_loop_edges(mesh):
+    return get_array(mesh.loops, 'edge_index', np.int32)
+
+def get_face_loop_starts(mesh):
+    return get_array(mesh.polygons, 'loop_start', np.int32)
+
+def get_face_loop_totals(mesh):
+    return get_array(mesh.polygons, 'loop_total', np.int32)
+
+# Fill an empty mesh from flat arrays: vert coordinates (N x 3), the vert index of every 
+# face corner listed face after face (loop_verts), and the number of corners of each 
+# face (loop_totals). Edges are derived from the faces. Pass edge_verts (M x 2) to also 
+# add edges that don't belong to any face (e.g. bare rings). Deriving the edges rebuilds 
+# the edge array in Blender's own order, so edge_verts only keep their order (edge i is 
+# edge_verts[i]) when there are no faces; look edges up by their verts otherwise.
+def fill_mesh(mesh, coords, loop_verts, loop_totals, edge_verts = None):
+    loop_totals = np.asarray(loop_totals, dtype = np.int32)
+    loop_starts = np.zeros(len(loop_totals), dtype = np.int32)
+    np.cumsum(loop_totals[:-1], out = loop_starts[1:])
+    mesh.vertices.add(len(coords))
+    set_array(mesh.vertices, 'co', np.asarray(coords, dtype = np.float32))
+    if edge_verts is not None:
+        mesh.edges.add(len(edge_verts))
+        set_array(mesh.edges, 'vertices', np.asarray(edge_verts, dtype = np.int32))
+    mesh.loops.add(len(loop_verts))
+    set_array(mesh.loops, 'vertex_index', np.asarray(loop_verts, dtype = np.int32))
+    mesh.polygons.add(len(loop_totals))
+    set_array(mesh.polygons, 'loop_start', loop_starts)
+    set_array(mesh.polygons, 'loop_total', loop_totals)
+    mesh.update(calc_edges = edge_verts is None or len(loop_totals) > 0)
+    return mesh
+
+# Replace the selection of the mesh with the given masks (None deselects everything of 
+# that type), the same way select_all(action = 'DESELECT') followed by setting .select 
+# on individual bmesh elements would. Selected faces also select their edges and verts, 
+# and selected edges select their verts. One foreach_set per element type. Pass the 
+# mesh's AdjacencyIndex as index to reuse its arrays instead of reading them again.
+def set_selection(mesh, vert_mask = None, edge_mask = None, face_mask = None, index = None):
+    num_verts = len(mesh.vertices)
+    num_edges = len(mesh.edges)
+    vert_sel = np.zeros(num_verts, dtype = bool) if vert_mask is None \
+        else np.array(vert_mask, dtype = bool)
+    edge_sel = np.zeros(num_edges, dtype = bool) if edge_mask is None \
+        else np.array(edge_mask, dtype = bool)
+    face_sel = np.zeros(len(mesh.polygons), dtype = bool) if face_mask is None \
+        else np.array(face_mask, dtype = bool)
+
+    if face_sel.any():
+        if index is None:
+            flush_face_selection(face_sel, get_face_loop_starts(mesh), get_face_loop_totals(mesh), \
+                get_loop_verts(mesh), get_loop_edges(mesh), vert_sel, edge_sel)
+        else:
+            flush_face_selection(face_sel, index.loop_starts, index.loop_totals, \
+                index.loop_verts, index.loop_edges, vert_sel, edge_sel)
+    if edge_sel.any():
+        edge_verts = get_edge_verts(mesh) if index is None else index.edge_verts
+        flush_edge_selection(edge_sel, edge_verts, vert_sel)
+
+    set_array(mesh.vertices, 'select', vert_sel)
+    set_array(mesh.edges, 'select', edge_sel)
+    set_array(mesh.polygons, 'select', face_sel)
+
+# Edge attribute written by mark_edges for each target, and whether it is a flag or a weight.
+edge_mark_targets = {
+    'SHARP': ('use_edge_sharp', bool),
+    'SEAM': ('use_seam', bool),
+    'CREASE': ('crease', np.float32),
+    'BEVEL_WEIGHT': ('bevel_weight', np.float32),
+    }
+
+# Mark the edges in edge_mask as sharp/seam, or set their crease/bevel weight to value. 
+# Edges outside the mask keep whatever they had before (like mark_seam(clear = False)).
+def mark_edges(mesh, edge_mask, target = 'SHARP', value = 1.0):
+    attr, dtype = edge_mark_targets[target]
+    if target == 'CREASE':
+        mesh.use_customdata_edge_crease = True
+    elif target == 'BEVEL_WEIGHT':
+        mesh.use_customdata_edge_bevel = True
+    arr = get_array(mesh.edges, attr, dtype)
+    arr[edge_mask] = True if dtype is bool else value
+    set_array(mesh.edges, attr, arr)
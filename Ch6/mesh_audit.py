@@ -0,0 +1,75 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "export_mesh_arrays",
+    "audit_scene",
+    "print_audit_report",
+    )
+
+import multiprocessing
+
+import bpy
+
+from Ch6.mesh_arrays import *
+from Ch6.topology_arrays import *
+
+# Read everything audit_mesh_arrays needs from a mesh object, in the order it takes them. 
+# An object that is in Edit mode is synced with update_from_editmode(), which leaves its 
+# mode (and the active object) untouched.
+def export_mesh_arrays(obj):
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+    mesh = obj.data
+    return (len(mesh.vertices), get_edge_verts(mesh), get_face_loop_starts(mesh), \
+        get_face_loop_totals(mesh), get_loop_edges(mesh), get_face_normals(mesh), \
+        get_array(mesh.edges, 'use_edge_sharp', bool))
+
+# Check the poles, ngons, non-quads and sharp edges of every mesh object in the scene 
+# without changing the active object or its mode. Each mesh is exported once, and the 
+# analysis runs in a pool of processes (defaults to one per CPU). Pass processes = 1 to 
+# run everything in Blender's own process instead.
+# Returns {object name: report dict}, see audit_mesh_arrays in Ch6/topology_arrays.py.
+def audit_scene(context, sharp_angle = 30, processes = None):
+    mesh_objs = [obj for obj in context.scene.objects if obj.type == 'MESH']
+    jobs = [export_mesh_arrays(obj) + (sharp_angle,) for obj in mesh_objs]
+
+    if processes == 1 or len(jobs) < 2:
+        reports = [audit_mesh_arrays(*job) for job in jobs]
+    else:
+        # sys.executable is the Blender binary itself, so point process spawning (the 
+        # default on Windows) to Blender's bundled Python interpreter instead.
+        multiprocessing.set_executable(bpy.app.binary_path_python)
+        pool = multiprocessing.Pool(processes)
+        try:
+            reports = pool.starmap(audit_mesh_arrays, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    return {obj.name: report for obj, report in zip(mesh_objs, reports)}
+
+def print_audit_report(audit):
+    for name in sorted(audit):
+        report = audit[name]
+        print('{}: {} poles, {} ngons, {} non-quads ({:.1%}), {} sharp edges ({} marked)'.format( \
+            name, report['poles'], report['ngons'], report['non_quads'], \
+            report['non_quad_ratio'], report['sharp_edges'], report['marked_sharp_edges']))
+
+# Sample usage----------------------------------------------------
+#print_audit_report(audit_scene(bpy.context, sharp_angle = 30))
@@ -2,8 +2,67 @@
 import bmesh
 from mathutils import Vector
 import math 
+import numpy as np
 
-def select_poles(context):
+from Ch6.adjacency_index import *
+from Ch6.mesh_arrays import *
+from Ch6.streaming_analysis import *
+from Ch6.topology_arrays import *
+
+# ========== Direct-Data Selection ===============================================
+# Select flags can only be written to the mesh data in Object mode (the edit mesh would 
+# overwrite them otherwise), so this is the only mode switch needed up front.
+def leave_edit_mode(obj):
+    if obj.mode == 'EDIT':
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+
+# With enter_edit_mode, make obj active and put it into Edit mode once, with the given 
+# select_mode ([vert, edge, face]). Otherwise obj stays in Object mode, which is what 
+# batch runs without a UI (blender -b) want.
+def finish_selection(context, obj, select_mode, enter_edit_mode):
+    if enter_edit_mode:
+        context.scene.tool_settings.mesh_select_mode = select_mode
+        context.scene.objects.active = obj
+        bpy.ops.object.mode_set(mode = 'EDIT')
+
+# Replace the selection of obj with the given masks by writing the select flags straight 
+# into its mesh data with foreach_set (see set_selection in Ch6/mesh_arrays.py). No 
+# select_all, update_edit_mesh or scene update is involved.
+def select_mesh_elements(context, obj, vert_mask = None, edge_mask = None, face_mask = None, \
+    select_mode = [True, True, True], enter_edit_mode = False):
+    leave_edit_mode(obj)
+    set_selection(obj.data, vert_mask, edge_mask, face_mask)
+    finish_selection(context, obj, select_mode, enter_edit_mode)
+
+def get_mesh_obj(context, obj):
+    if obj is None:
+        obj = context.scene.objects.active
+    return obj if obj is not None and obj.type == 'MESH' else None
+
+# Run one of the selectors below over many objects, e.g. 
+# run_selector_batch(context, objs, select_ngons), leaving them all in Object mode.
+def run_selector_batch(context, objs, selector, *args, **kwargs):
+    kwargs['enter_edit_mode'] = False
+    for obj in objs:
+        selector(context, *args, obj = obj, **kwargs)
+
+# The selectors below (and auto_mark_sharp) all take obj and enter_edit_mode the same 
+# way: they work on obj, or on the active object when obj is None, and end in Edit mode 
+# like before unless enter_edit_mode is False. For select_poles, select_ngons 
+# and select_non_quads, pass a chunk_size to analyze very large meshes in bounded memory 
+# (see Ch6/streaming_analysis.py).
+def select_poles(context, chunk_size = None, obj = None, enter_edit_mode = True):
+    obj = get_mesh_obj(context, obj)
+    if obj is not None:
+        leave_edit_mode(obj)
+        if chunk_size is not None:
+            select_poles_streaming(obj.data, chunk_size)
+        else:
+            index = get_adjacency_index(obj.data)
+            set_selection(obj.data, vert_mask = pole_mask(index.valences()), index = index)
+        finish_selection(context, obj, [True, False, False], enter_edit_mode)
+
+def select_poles_bmesh(context):
     obj = context.scene.objects.active
     if obj is not None and obj.type == 'MESH':
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -33,7 +92,47 @@ def get_angle_between_edges(e1, e2):
     vector2 = e2_end_v.co - vert_shared.co
     return get_angle_between_vectors(vector1, vector2)       
     
-def select_face_corners_less_than_angle(context, angle_in_degrees):
+# Edges of bm that make an angle of at most angle_in_degrees with the next edge around 
+# one of their verts, found with the same per-vert walk as 
+# select_face_corners_less_than_angle_bmesh.
+def link_edge_angle_mask(bm, angle_in_degrees):
+    bm.edges.index_update()
+    edge_mask = np.zeros(len(bm.edges), dtype = bool)
+    for v in bm.verts:
+        num_edges = len(v.link_edges)
+        for i in range(num_edges):
+            e1 = v.link_edges[i]
+            e2 = v.link_edges[0] if i == num_edges - 1 else v.link_edges[i+1]
+            if get_angle_between_edges(e1, e2) <= angle_in_degrees:
+                edge_mask[e1.index] = True
+                edge_mask[e2.index] = True
+    return edge_mask
+
+# mode is 'FACE_CORNERS' to measure the angle at every corner of every face from the 
+# loop arrays, or 'LINK_EDGES' for the original per-vert walk, run on a bmesh read 
+# from obj's mesh data so it doesn't need obj to be active or in Edit mode either.
+def select_face_corners_less_than_angle(context, angle_in_degrees, mode = 'FACE_CORNERS', \
+    obj = None, enter_edit_mode = True):
+    obj = get_mesh_obj(context, obj)
+    if obj is not None:
+        leave_edit_mode(obj)
+        mesh = obj.data
+        if mode == 'LINK_EDGES':
+            bm = bmesh.new()
+            bm.from_mesh(mesh)
+            edge_mask = link_edge_angle_mask(bm, angle_in_degrees)
+            bm.free()
+            set_selection(mesh, edge_mask = edge_mask)
+        else:
+            index = get_adjacency_index(mesh)
+            angles, prev_loops = face_corner_angles(get_vert_coords(mesh), index.loop_starts, \
+                index.loop_totals, index.loop_verts)
+            edge_mask = corner_edge_mask(angles, prev_loops, index.loop_edges, index.num_edges, \
+                angle_in_degrees)
+            set_selection(mesh, edge_mask = edge_mask, index = index)
+        finish_selection(context, obj, [False, True, False], enter_edit_mode)
+
+def select_face_corners_less_than_angle_bmesh(context, angle_in_degrees):
     obj = context.scene.objects.active
     if obj is not None and obj.type == 'MESH':
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -52,7 +151,30 @@ def select_face_corners_less_than_angle(context, angle_in_degrees):
         bmesh.update_edit_mesh(obj.data)
         context.scene.update()
         
-def auto_mark_sharp(context, angle_in_degrees):
+# Mark every edge between two faces whose normals are angle_in_degrees or more apart. 
+# target is 'SHARP', 'SEAM', 'CREASE' or 'BEVEL_WEIGHT'; creases and bevel weights are 
+# set to value. Works directly on the mesh data, without selection or operators.
+def mark_sharp_edges(mesh, angle_in_degrees, target = 'SHARP', value = 1.0):
+    index = get_adjacency_index(mesh)
+    edge_mask = sharp_edge_mask(get_face_normals(mesh), index.edge_face_offsets, \
+        index.edge_faces, angle_in_degrees)
+    mark_edges(mesh, edge_mask, target, value)
+    return edge_mask
+
+def auto_mark_sharp(context, angle_in_degrees, target = 'SHARP', value = 1.0, obj = None, \
+    enter_edit_mode = True):
+    obj = get_mesh_obj(context, obj)
+    if obj is not None:
+        # Edits made to the mesh data while in Edit mode would be overwritten by the 
+        # edit mesh, so step out of Edit mode for the write and come back afterwards 
+        # (unless enter_edit_mode is False).
+        mode_to_restore = obj.mode
+        leave_edit_mode(obj)
+        mark_sharp_edges(obj.data, angle_in_degrees, target, value)
+        if enter_edit_mode and mode_to_restore == 'EDIT':
+            bpy.ops.object.mode_set(mode = 'EDIT')
+
+def auto_mark_sharp_bmesh(context, angle_in_degrees):
     obj = context.scene.objects.active
     if obj is not None and obj.type == 'MESH':
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -69,7 +191,18 @@ def auto_mark_sharp(context, angle_in_degrees):
         bpy.ops.mesh.mark_seam(clear = False)
         bpy.ops.mesh.select_all(action = 'DESELECT')
 
-def select_ngons(context):
+def select_ngons(context, chunk_size = None, obj = None, enter_edit_mode = True):
+    obj = get_mesh_obj(context, obj)
+    if obj is not None:
+        leave_edit_mode(obj)
+        if chunk_size is not None:
+            select_ngons_streaming(obj.data, chunk_size)
+        else:
+            index = get_adjacency_index(obj.data)
+            set_selection(obj.data, face_mask = ngon_mask(index.loop_totals), index = index)
+        finish_selection(context, obj, [False, False, True], enter_edit_mode)
+
+def select_ngons_bmesh(context):
     obj = context.scene.objects.active
     if obj is not None and obj.type == 'MESH':
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -82,7 +215,18 @@ def select_ngons(context):
         bmesh.update_edit_mesh(obj.data)
         context.scene.update()
         
-def select_non_quads(context):
+def select_non_quads(context, chunk_size = None, obj = None, enter_edit_mode = True):
+    obj = get_mesh_obj(context, obj)
+    if obj is not None:
+        leave_edit_mode(obj)
+        if chunk_size is not None:
+            select_non_quads_streaming(obj.data, chunk_size)
+        else:
+            index = get_adjacency_index(obj.data)
+            set_selection(obj.data, face_mask = non_quad_mask(index.loop_totals), index = index)
+        finish_selection(context, obj, [False, False, True], enter_edit_mode)
+
+def select_non_quads_bmesh(context):
     obj = context.scene.objects.active
     if obj is not None and obj.type == 'MESH':
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -99,5 +243,5 @@ def select_non_quads(context):
 #select_poles(bpy.context)
 #select_ngons(bpy.context)
 #select_non_quads(bpy.context)
-select_face_corners_less_than_angle(bpy.context, 60)
+#select_face_corners_less_than_angle(bpy.context, 60)
 #auto_mark_sharp(bpy.context, 60)
\ No newline at end of file
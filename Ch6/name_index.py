@@ -0,0 +1,158 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "NameIndex",
+    "get_name_index",
+    "scene_object_index",
+    "data_name_index",
+    "register_name_index",
+    "unregister_name_index",
+    "clear_name_index",
+    )
+
+# Cached name lookups for scene objects and bpy.data collections. The elements of a 
+# collection are read once with items() into a dict by name, and get() returns the 
+# element straight from that dict, without asking the collection again. The only check 
+# on a hit is that the element still has that name: a removed element raises 
+# ReferenceError and a renamed one has another name, and either way the whole dict is 
+# dropped and read again on the next lookup.
+#
+# A scene_update_post handler drops a dict when its collection gained or lost elements. 
+# It compares element counts, and only for the bpy.data collections that report 
+# is_updated, so moving objects around doesn't throw the dicts away. load_post drops all 
+# indices, since they are keyed by pointers into the old file. The handlers only run on 
+# scene updates, so a script that adds an element and looks it up again before the next 
+# update has to add() it itself, e.g. scene_object_index(scene).add(obj.name, obj).
+#
+# Grease pencil layers are left out: the only code looking them up is the Sculpt & Retopo 
+# Toolkit, which is installed as a single-file add-on and can't import this package.
+
+import bpy
+from bpy.app.handlers import persistent
+
+# Elements of one collection by name. get_collection returns the collection (it is 
+# replaced by a fresh one each time the index is fetched, so no stale reference to a 
+# scene is kept around). source_attrs are the bpy.data collections whose element counts 
+# are recorded to tell when the dict is out of date.
+class NameIndex:
+    def __init__(self, get_collection, source_attrs):
+        self.get_collection = get_collection
+        self.source_attrs = source_attrs
+        self.elements = None
+        self.length = 0
+        self.source_counts = {}
+
+    def read(self):
+        collection = self.get_collection()
+        self.elements = dict(collection.items())
+        self.length = len(self.elements)
+        self.source_counts = {attr: len(getattr(bpy.data, attr)) for attr in self.source_attrs}
+
+    def get(self, name):
+        if self.elements is None:
+            self.read()
+        element = self.elements.get(name)
+        if element is None:
+            return None
+        try:
+            if element.name == name:
+                return element
+        except ReferenceError:
+            pass
+        self.read()
+        return self.elements.get(name)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def add(self, name, element):
+        if self.elements is not None:
+            self.elements[name] = element
+
+    def discard(self, name):
+        if self.elements is not None:
+            self.elements.pop(name, None)
+
+    def invalidate(self):
+        self.elements = None
+
+name_indices = {}
+
+def get_name_index(key, get_collection, source_attrs):
+    index = name_indices.get(key)
+    if index is None:
+        register_name_index()
+        index = NameIndex(get_collection, source_attrs)
+        name_indices[key] = index
+    else:
+        index.get_collection = get_collection
+    return index
+
+# Objects linked to the scene. Adding and removing objects changes the count of 
+# bpy.data.objects; linking and unlinking is caught by the handler, which is passed the 
+# scene, comparing the length of scene.objects.
+def scene_object_index(scene):
+    return get_name_index(('scene_objects', scene.as_pointer()), lambda: scene.objects, \
+        ('objects',))
+
+# A bpy.data collection by attribute name, e.g. 'images' or 'meshes'.
+def data_name_index(attr):
+    return get_name_index(('data', attr), lambda: getattr(bpy.data, attr), (attr,))
+
+@persistent
+def sync_name_indices(scene):
+    if not name_indices:
+        return
+    counts = {}
+    for attr in set(attr for index in name_indices.values() for attr in index.source_attrs):
+        if getattr(getattr(bpy.data, attr), 'is_updated', True):
+            counts[attr] = len(getattr(bpy.data, attr))
+    scene_key = ('scene_objects', scene.as_pointer())
+    for key, index in name_indices.items():
+        if index.elements is None:
+            continue
+        if any(counts.get(attr, count) != count for attr, count in index.source_counts.items()):
+            index.invalidate()
+        elif key == scene_key and len(scene.objects) != index.length:
+            index.invalidate()
+
+@persistent
+def clear_name_index_on_load(dummy):
+    clear_name_index()
+
+def register_name_index():
+    if sync_name_indices not in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.append(sync_name_indices)
+    if clear_name_index_on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(clear_name_index_on_load)
+
+def unregister_name_index():
+    if sync_name_indices in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.remove(sync_name_indices)
+    if clear_name_index_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_name_index_on_load)
+    clear_name_index()
+
+def clear_name_index():
+    name_indices.clear()
+
+# Sample usage----------------------------------------------------
+#if 'Cone' not in scene_object_index(bpy.context.scene):
+#    print('no cone yet')
+#image = data_name_index('images').get('Untitled')
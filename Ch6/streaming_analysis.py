@@ -0,0 +1,98 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "chunk_ranges",
+    "stream_vert_valences",
+    "select_poles_streaming",
+    "select_faces_streaming",
+    "select_ngons_streaming",
+    "select_non_quads_streaming",
+    )
+
+# Bounded-memory versions of the mesh_connectivity analyses for very large meshes. 
+# foreach_get/foreach_set only move whole attributes, so instead of building a BMesh (or 
+# an AdjacencyIndex) these read one flat attribute at a time, work through it in chunks 
+# of chunk_size elements, and drop it before reading the next one. Peak memory is one 
+# int32 attribute array plus boolean masks (the selections, and for the face analyses 
+# one flag per loop) plus chunk-sized temporaries.
+
+import numpy as np
+
+from Ch6.mesh_arrays import *
+from Ch6.topology_arrays import *
+
+def chunk_ranges(total, chunk_size):
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total)
+
+def stream_vert_valences(mesh, chunk_size):
+    edge_verts = get_edge_verts(mesh).ravel()
+    valences = np.zeros(len(mesh.vertices), dtype = np.int32)
+    for start, stop in chunk_ranges(len(edge_verts), chunk_size*2):
+        verts, counts = np.unique(edge_verts[start:stop], return_counts = True)
+        valences[verts] += counts
+    return valences
+
+def select_poles_streaming(mesh, chunk_size = 1 << 20):
+    valences = stream_vert_valences(mesh, chunk_size)
+    vert_sel = np.zeros(len(mesh.vertices), dtype = bool)
+    for start, stop in chunk_ranges(len(vert_sel), chunk_size):
+        vert_sel[start:stop] = pole_mask(valences[start:stop])
+    del valences
+    set_array(mesh.vertices, 'select', vert_sel)
+    set_array(mesh.edges, 'select', np.zeros(len(mesh.edges), dtype = bool))
+    set_array(mesh.polygons, 'select', np.zeros(len(mesh.polygons), dtype = bool))
+    return vert_sel
+
+# Select the faces for which face_test(loop_totals) is True, and flush the selection to 
+# their verts and edges one loop attribute at a time. The loops of the selected faces 
+# are turned into a boolean loop mask first, so loop_totals and loop_starts are gone by 
+# the time the loop attributes are read.
+def select_faces_streaming(mesh, face_test, chunk_size = 1 << 20):
+    loop_totals = get_face_loop_totals(mesh)
+    face_sel = np.zeros(len(loop_totals), dtype = bool)
+    for start, stop in chunk_ranges(len(face_sel), chunk_size):
+        face_sel[start:stop] = face_test(loop_totals[start:stop])
+    loop_starts = get_face_loop_starts(mesh)
+    loop_sel = np.zeros(len(mesh.loops), dtype = bool)
+    for start, stop in chunk_ranges(len(face_sel), chunk_size):
+        faces = start + np.flatnonzero(face_sel[start:stop])
+        if len(faces) > 0:
+            loop_sel[face_loop_indices(loop_starts[faces], loop_totals[faces])[0]] = True
+    del loop_starts, loop_totals
+
+    vert_sel = np.zeros(len(mesh.vertices), dtype = bool)
+    edge_sel = np.zeros(len(mesh.edges), dtype = bool)
+    for attr, sel in (('vertex_index', vert_sel), ('edge_index', edge_sel)):
+        loop_values = get_array(mesh.loops, attr, np.int32)
+        for start, stop in chunk_ranges(len(loop_sel), chunk_size):
+            sel[loop_values[start:stop][loop_sel[start:stop]]] = True
+        del loop_values
+    del loop_sel
+
+    set_array(mesh.vertices, 'select', vert_sel)
+    set_array(mesh.edges, 'select', edge_sel)
+    set_array(mesh.polygons, 'select', face_sel)
+    return face_sel
+
+def select_ngons_streaming(mesh, chunk_size = 1 << 20):
+    return select_faces_streaming(mesh, ngon_mask, chunk_size)
+
+def select_non_quads_streaming(mesh, chunk_size = 1 << 20):
+    return select_faces_streaming(mesh, non_quad_mask, chunk_size)
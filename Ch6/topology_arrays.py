@@ -0,0 +1,283 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+__all__ = (
+    "face_loop_indices",
+    "vert_valences",
+    "pole_mask",
+    "ngon_mask",
+    "non_quad_mask",
+    "flush_edge_selection",
+    "flush_face_selection",
+    "loop_prev_next",
+    "face_corner_angles",
+    "corner_edge_mask",
+    "loop_faces",
+    "csr_from_pairs",
+    "manifold_edge_faces",
+    "dihedral_angles",
+    "sharp_edge_mask",
+    "audit_mesh_arrays",
+    "face_areas",
+    "loose_edge_mask",
+    "zero_length_edge_mask",
+    "duplicate_face_mask",
+    "collapse_edge_targets",
+    "find_degenerate_geometry",
+    "diff_edge_verts",
+    "diff_loop_totals",
+    "resized",
+    )
+
+# Pure NumPy kernels that work on the flat arrays exported from a mesh with foreach_get 
+# (see Ch6/mesh_arrays.py). Nothing in here touches bpy or bmesh, so the same functions 
+# can run inside Blender or in plain Python worker processes.
+
+import numpy as np
+
+# Loops are stored contiguously per polygon, but the polygons are not guaranteed to 
+# appear in the same order as their loops. Return the loop indices in polygon order 
+# along with the polygon each of those loops belongs to.
+def face_loop_indices(loop_starts, loop_totals):
+    num_loops = int(loop_totals.sum())
+    face_of_loop = np.repeat(np.arange(len(loop_totals), dtype = np.int32), loop_totals)
+    # Offset of each loop within its own polygon (0, 1, ..., loop_total - 1).
+    first_loop = np.cumsum(loop_totals) - loop_totals
+    corner = np.arange(num_loops, dtype = np.int32) - np.repeat(first_loop, loop_totals)
+    loop_indices = np.repeat(loop_starts, loop_totals) + corner
+    return loop_indices, face_of_loop
+
+# The valence of a vert is the number of edges connected to it.
+def vert_valences(num_verts, edge_verts):
+    return np.bincount(edge_verts.ravel(), minlength = num_verts)
+
+# Poles are verts with 3 or more than 4 edges connected to them.
+def pole_mask(valences):
+    return (valences == 3) | (valences > 4)
+
+def ngon_mask(loop_totals):
+    return loop_totals > 4
+
+def non_quad_mask(loop_totals):
+    return loop_totals != 4
+
+# Selecting an edge also selects its two verts (same as BMEdge.select = True).
+def flush_edge_selection(edge_mask, edge_verts, vert_mask):
+    vert_mask[edge_verts[edge_mask].ravel()] = True
+    return vert_mask
+
+# Selecting a face also selects all of its edges and verts (same as BMFace.select = True).
+def flush_face_selection(face_mask, loop_starts, loop_totals, loop_verts, loop_edges, \
+    vert_mask, edge_mask):
+    loop_indices, face_of_loop = face_loop_indices(loop_starts, loop_totals)
+    selected_loops = loop_indices[face_mask[face_of_loop]]
+    vert_mask[loop_verts[selected_loops]] = True
+    edge_mask[loop_edges[selected_loops]] = True
+    return vert_mask, edge_mask
+
+# For every loop, the index of the previous and next loop around the same polygon 
+# (indexed by loop index).
+def loop_prev_next(loop_starts, loop_totals):
+    loop_indices, face_of_loop = face_loop_indices(loop_starts, loop_totals)
+    first = loop_starts[face_of_loop]
+    total = loop_totals[face_of_loop]
+    corner = loop_indices - first
+    prev_loops = np.empty_like(loop_indices)
+    next_loops = np.empty_like(loop_indices)
+    prev_loops[loop_indices] = first + (corner - 1) % total
+    next_loops[loop_indices] = first + (corner + 1) % total
+    return prev_loops, next_loops
+
+# Angle (in degrees) of every face corner, indexed by loop index. The angle at a loop is 
+# the one between the two edges of its polygon that meet at the loop's vert. Corners 
+# with a zero-length edge have no defined angle and are reported as 0 degrees, so they 
+# show up as the sharpest corners instead of raising from acos.
+def face_corner_angles(coords, loop_starts, loop_totals, loop_verts):
+    prev_loops, next_loops = loop_prev_next(loop_starts, loop_totals)
+    co = coords.astype(np.float64)
+    corner_co = co[loop_verts]
+    vec1 = co[loop_verts[prev_loops]] - corner_co
+    vec2 = co[loop_verts[next_loops]] - corner_co
+    lengths = np.sqrt((vec1*vec1).sum(axis = 1)*(vec2*vec2).sum(axis = 1))
+    degenerate = lengths == 0
+    lengths[degenerate] = 1
+    cos_theta = np.clip((vec1*vec2).sum(axis = 1)/lengths, -1, 1)
+    angles = np.degrees(np.arccos(cos_theta))
+    angles[degenerate] = 0
+    return angles, prev_loops
+
+# Edges on either side of every face corner whose angle is <= max_angle.
+def corner_edge_mask(angles, prev_loops, loop_edges, num_edges, max_angle):
+    sharp_loops = np.flatnonzero(angles <= max_angle)
+    edge_mask = np.zeros(num_edges, dtype = bool)
+    edge_mask[loop_edges[sharp_loops]] = True
+    edge_mask[loop_edges[prev_loops[sharp_loops]]] = True
+    return edge_mask
+
+# The polygon each loop belongs to, indexed by loop index.
+def loop_faces(loop_starts, loop_totals):
+    loop_indices, face_of_loop = face_loop_indices(loop_starts, loop_totals)
+    faces = np.empty_like(face_of_loop)
+    faces[loop_indices] = face_of_loop
+    return faces
+
+# Group values by key in compressed sparse row form: the values of key k are 
+# values_sorted[offsets[k]:offsets[k + 1]], in their original order.
+def csr_from_pairs(keys, values, num_keys):
+    order = np.argsort(keys, kind = 'mergesort')
+    offsets = np.zeros(num_keys + 1, dtype = np.int64)
+    np.cumsum(np.bincount(keys, minlength = num_keys), out = offsets[1:])
+    return offsets, values[order]
+
+# Edges with exactly two faces, along with those two faces.
+def manifold_edge_faces(edge_face_offsets, edge_faces):
+    counts = np.diff(edge_face_offsets)
+    edges = np.flatnonzero(counts == 2)
+    first = edge_face_offsets[edges]
+    return edges, edge_faces[first], edge_faces[first + 1]
+
+# Angle (in degrees) between the normals of each pair of faces.
+def dihedral_angles(face_normals, faces_a, faces_b):
+    normals_a = face_normals[faces_a].astype(np.float64)
+    normals_b = face_normals[faces_b].astype(np.float64)
+    lengths = np.sqrt((normals_a*normals_a).sum(axis = 1)*(normals_b*normals_b).sum(axis = 1))
+    lengths[lengths == 0] = 1
+    cos_theta = np.clip((normals_a*normals_b).sum(axis = 1)/lengths, -1, 1)
+    return np.degrees(np.arccos(cos_theta))
+
+# Edges shared by exactly two faces whose normals differ by min_angle degrees or more.
+def sharp_edge_mask(face_normals, edge_face_offsets, edge_faces, min_angle):
+    edges, faces_a, faces_b = manifold_edge_faces(edge_face_offsets, edge_faces)
+    edge_mask = np.zeros(len(edge_face_offsets) - 1, dtype = bool)
+    edge_mask[edges[dihedral_angles(face_normals, faces_a, faces_b) >= min_angle]] = True
+    return edge_mask
+
+# Mesh quality report from the exported arrays of one mesh (see Ch6/mesh_audit.py). 
+# Only needs NumPy, so it can run in a worker process.
+def audit_mesh_arrays(num_verts, edge_verts, loop_starts, loop_totals, loop_edges, \
+    face_normals, edge_sharp_flags, sharp_angle):
+    num_faces = len(loop_totals)
+    edge_face_offsets, edge_faces = csr_from_pairs(loop_edges, \
+        loop_faces(loop_starts, loop_totals), len(edge_verts))
+    num_non_quads = int(non_quad_mask(loop_totals).sum())
+    return {
+        'verts': num_verts,
+        'edges': len(edge_verts),
+        'faces': num_faces,
+        'poles': int(pole_mask(vert_valences(num_verts, edge_verts)).sum()),
+        'ngons': int(ngon_mask(loop_totals).sum()),
+        'non_quads': num_non_quads,
+        'non_quad_ratio': num_non_quads/num_faces if num_faces > 0 else 0.0,
+        'sharp_edges': int(sharp_edge_mask(face_normals, edge_face_offsets, edge_faces, \
+            sharp_angle).sum()),
+        'marked_sharp_edges': int(edge_sharp_flags.sum()),
+        }
+
+# Area of every polygon, by Newell's method around the polygon's first vert, so concave 
+# and non-planar ngons are measured too.
+def face_areas(coords, loop_starts, loop_totals, loop_verts):
+    loop_indices, face_of_loop = face_loop_indices(loop_starts, loop_totals)
+    prev_loops, next_loops = loop_prev_next(loop_starts, loop_totals)
+    origin = coords[loop_verts[loop_starts]].astype(np.float64)[face_of_loop]
+    co = coords[loop_verts[loop_indices]] - origin
+    next_co = coords[loop_verts[next_loops[loop_indices]]] - origin
+    cross = np.cross(co, next_co)
+    normal_sums = np.empty((len(loop_totals), 3))
+    for k in range(3):
+        normal_sums[:, k] = np.bincount(face_of_loop, weights = cross[:, k], \
+            minlength = len(loop_totals))
+    return 0.5*np.sqrt((normal_sums*normal_sums).sum(axis = 1))
+
+# Edges that aren't used by any face.
+def loose_edge_mask(num_edges, loop_edges):
+    return np.bincount(loop_edges, minlength = num_edges) == 0
+
+def zero_length_edge_mask(coords, edge_verts, distance):
+    vecs = coords[edge_verts[:, 1]].astype(np.float64) - coords[edge_verts[:, 0]]
+    return (vecs*vecs).sum(axis = 1) <= distance*distance
+
+# Faces that use the same verts as a face with a lower index, in any order. Each face's 
+# verts are sorted, then faces of the same size are sorted as rows (stable, so the 
+# lowest index of each group comes first and is kept).
+def duplicate_face_mask(loop_starts, loop_totals, loop_verts):
+    loop_indices, face_of_loop = face_loop_indices(loop_starts, loop_totals)
+    verts = loop_verts[loop_indices]
+    sorted_verts = verts[np.lexsort((verts, face_of_loop))]
+    first_loop = np.cumsum(loop_totals) - loop_totals
+    mask = np.zeros(len(loop_totals), dtype = bool)
+    for total in np.unique(loop_totals):
+        faces = np.flatnonzero(loop_totals == total)
+        rows = sorted_verts[first_loop[faces][:, None] + np.arange(total)]
+        order = np.lexsort(rows.T[::-1])
+        rows = rows[order]
+        same = (rows[1:] == rows[:-1]).all(axis = 1)
+        mask[faces[order[1:][same]]] = True
+    return mask
+
+# Collapsing edges merges their verts; chains of edges collapse into one vert. Returns 
+# (sources, targets) for weld_verts, each target being the lowest vert of its chain.
+def collapse_edge_targets(num_verts, edge_verts):
+    labels = np.arange(num_verts)
+    while True:
+        lowest = np.minimum(labels[edge_verts[:, 0]], labels[edge_verts[:, 1]])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, edge_verts[:, 0], lowest)
+        np.minimum.at(new_labels, edge_verts[:, 1], lowest)
+        new_labels = new_labels[new_labels]
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+    sources = np.flatnonzero(labels != np.arange(num_verts))
+    return sources, labels[sources]
+
+# Masks of the geometry a clean-up pass should get rid of: loose edges (no faces), loose 
+# verts (no edges once the loose edges are gone), faces with an area of at most area, 
+# duplicate faces, and edges of faces that are at most distance long.
+def find_degenerate_geometry(coords, edge_verts, loop_starts, loop_totals, loop_verts, \
+    loop_edges, distance = 1e-6, area = 1e-12):
+    loose_edges = loose_edge_mask(len(edge_verts), loop_edges)
+    return {
+        'loose_verts': vert_valences(len(coords), edge_verts[~loose_edges]) == 0,
+        'loose_edges': loose_edges,
+        'zero_area_faces': face_areas(coords, loop_starts, loop_totals, loop_verts) <= area,
+        'duplicate_faces': duplicate_face_mask(loop_starts, loop_totals, loop_verts),
+        'zero_length_edges': zero_length_edge_mask(coords, edge_verts, distance) & ~loose_edges,
+        }
+
+# Edges that were removed or added between two versions of an edge array, compared index 
+# by index: an edge whose verts changed counts as one removed and one added edge.
+def diff_edge_verts(old_edge_verts, new_edge_verts):
+    n = min(len(old_edge_verts), len(new_edge_verts))
+    changed = (old_edge_verts[:n] != new_edge_verts[:n]).any(axis = 1)
+    removed = np.concatenate((old_edge_verts[:n][changed], old_edge_verts[n:]))
+    added = np.concatenate((new_edge_verts[:n][changed], new_edge_verts[n:]))
+    return removed, added
+
+# Indices of the faces whose size changed between two versions of the loop_totals array, 
+# plus any faces that were appended.
+def diff_loop_totals(old_loop_totals, new_loop_totals):
+    n = min(len(old_loop_totals), len(new_loop_totals))
+    changed = np.flatnonzero(old_loop_totals[:n] != new_loop_totals[:n])
+    return np.concatenate((changed, np.arange(n, len(new_loop_totals))))
+
+# Copy of arr truncated or zero-padded to length n.
+def resized(arr, n):
+    out = np.zeros(n, dtype = arr.dtype)
+    m = min(n, len(arr))
+    out[:m] = arr[:m]
+    return out
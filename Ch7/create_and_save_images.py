@@ -28,13 +28,16 @@ import bpy
 from Ch7.split_screen_area import *
 from Ch7.view_fit import *
 from Ch7.uv_settings import *
+from Ch6.name_index import *
 
 def create_image_data_block(context, name, type='UV_GRID', color=(0, 0, 0, 1)):
-    if bpy.data.images.find(name) < 0:
+    images = data_name_index('images')
+    if images.get(name) is None:
     	# Create a new image data block with the specified name.
-    	bpy.data.images.new(name=name, width=1024, height=1024, alpha=True, float_buffer=False, stereo3d=False)
-    	bpy.data.images[name].generated_color = color
-    	bpy.data.images[name].generated_type = type
+    	image = bpy.data.images.new(name=name, width=1024, height=1024, alpha=True, float_buffer=False, stereo3d=False)
+    	images.add(image.name, image)
+    	image.generated_color = color
+    	image.generated_type = type
     
     # Make this image data block the actively selected one (same as when you select it from the drop down list).
     split_screen_area(context, 'VERTICAL', 0.5, 'IMAGE_EDITOR', True)
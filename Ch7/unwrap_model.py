@@ -28,6 +28,7 @@ import bmesh
 from Ch7.split_screen_area import *
 from Ch7.view_fit import *
 from Ch7.uv_settings import *
+from Ch6.name_index import *
 from Ch7.create_and_save_images import *
 
 def generate_and_seam_cube(context, obj_name='cube_obj', side_length=1, center=(0, 0, 0)):
@@ -119,11 +120,9 @@ def unwrap_model(context, model_name, num_min_stretch_iterations):
     bpy.ops.image.view_all(image_editor_context_override, fit_view=True)
 
     # Check if the object by model_name exists, and if it is of type mesh.
-    # find returns -1 if no object matching the given name exists.
-    if context.scene.objects.find(model_name) < 0:
-        return
-    obj = context.scene.objects[model_name]
-    if obj.type != 'MESH':
+    # get returns None if no object matching the given name exists.
+    obj = scene_object_index(context.scene).get(model_name)
+    if obj is None or obj.type != 'MESH':
         return
 
     # If so, set it to be the current active object, switch it to Edit mode, and select all (to unwrap all).
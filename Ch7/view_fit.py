@@ -18,23 +18,87 @@
 
 __all__ = (
     "get_context_override",
+    "clear_context_override_cache",
     )
 
 import bpy
 
+# Where the area and region were found for (window, screen, area type, region type) the 
+# last time: the number of areas the screen had, the position and pointer of the area in 
+# screen.areas and the position of the region in area.regions. Only hits are cached, 
+# so an editor switched to area_type later on is still found.
+context_override_cache = {}
+
+def find_area_index(screen, area_type):
+    for i, area in enumerate(screen.areas):
+        if area.type == area_type: # e.g. 'VIEW_3D' for viewport, 'IMAGE_EDITOR' for UV/Image Editor, etc.
+            return i
+    return -1
+
+def find_region_index(area, region_type):
+    for i, region in enumerate(area.regions):
+        if region.type == region_type: # e.g. 'WINDOW'
+            return i
+    return -1
+
+# The cached area and region if the screen still has the same number of areas and the 
+# area at the cached position is still the same one, of the same type; None otherwise. 
+# Splitting, joining or switching an editor fails one of these checks.
+def get_cached_area_and_region(screen, cached, area_type, region_type):
+    num_areas, area_index, area_pointer, region_index = cached
+    if len(screen.areas) != num_areas:
+        return None
+    area = screen.areas[area_index]
+    if area.as_pointer() != area_pointer or area.type != area_type:
+        return None
+    if region_index < 0:
+        return area, None
+    region = area.regions[region_index]
+    if region.type != region_type:
+        return None
+    return area, region
+
+def clear_context_override_cache():
+    context_override_cache.clear()
+
+# Context override for running an operator in the first area of type area_type, in its 
+# region of type region_type. Only the members operators look up are filled in instead 
+# of copying the whole context, and where the area and region were found is cached per 
+# window and screen (see get_cached_area_and_region). Without a matching area (or 
+# without any window, as in blender -b) the override still carries the scene and 
+# objects, but no area or region.
 def get_context_override(context, area_type, region_type):
     override = {}
     override['scene'] = context.scene
-    override['window'] = context.window
-    override['screen'] = context.window.screen
-    for area in override['screen'].areas:
-        if area.type == area_type: # e.g. 'VIEW_3D' for viewport, 'IMAGE_EDITOR' for UV/Image Editor, etc.
-            override['area'] = area
-            break
-    for region in override['area'].regions:
-        if region.type == region_type: # e.g. 'WINDOW'
-            override['region'] = region
+    override['blend_data'] = context.blend_data
+    override['active_object'] = context.active_object
+    override['object'] = context.object
     override['edit_object'] = context.edit_object
+    window = context.window
+    if window is None:
+        return override
+
+    screen = window.screen
+    override['window'] = window
+    override['screen'] = screen
+    key = (window.as_pointer(), screen.as_pointer(), area_type, region_type)
+    cached = context_override_cache.get(key)
+    found = None if cached is None else \
+        get_cached_area_and_region(screen, cached, area_type, region_type)
+    if found is None:
+        area_index = find_area_index(screen, area_type)
+        if area_index < 0:
+            context_override_cache.pop(key, None)
+            return override
+        area = screen.areas[area_index]
+        region_index = find_region_index(area, region_type)
+        context_override_cache[key] = (len(screen.areas), area_index, area.as_pointer(), region_index)
+        found = (area, None if region_index < 0 else area.regions[region_index])
+
+    area, region = found
+    override['area'] = area
+    if region is not None:
+        override['region'] = region
     return override
 
 # Sample usage----------------------------------------------------    